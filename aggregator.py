@@ -0,0 +1,206 @@
+from collections.abc import Mapping
+
+import itertools
+import operator
+import sys
+
+from defs import FormW2, Form1099, RealEstate, FormK1
+
+
+RENTAL_EXPENSES = (
+    'taxes',
+    'interests',
+    'hoa',
+    'insurance',
+    'advertising',
+    'legal',
+    'commission',
+    'management',
+    'repairs',
+    'utilities',
+    'depreciation',
+    'other',
+)
+
+
+def columnize(forms, form_type):
+    """Struct-of-arrays view of forms as a dict of field name to column.
+
+    forms is either a sequence of form_type records, transposed in one pass
+    into tuples, or already a mapping of field name to array, in which case
+    the arrays are used as is and missing fields get form_type's defaults.
+    """
+    if isinstance(forms, Mapping):
+        import numpy as np
+        size = len(next(iter(forms.values()), ()))
+        return {
+            field: np.asarray(forms[field]) if field in forms
+            else np.full(size, form_type._field_defaults[field])
+            for field in form_type._fields}
+    return dict(zip(
+        form_type._fields,
+        list(zip(*forms)) or [()] * len(form_type._fields)))
+
+
+def aggregate_forms(form_w2s, form_1099s, real_estates, form_k1s=None):
+    """Field totals of the forms, keyed by TaxComputer attribute name.
+
+    Each argument is a list of records from defs or a mapping of columns
+    (see columnize). Lists are summed in order, exactly like one sum() per
+    field would; numpy columns are summed vectorized. real_estates can also
+    be a RentalPortfolio, whose running totals are used as they are.
+    """
+    w2 = columnize(form_w2s, FormW2)
+    f1099 = columnize(form_1099s, Form1099)
+
+    totals = {
+        'w2': _total(w2['wages']),
+        'federal_income_tax_withheld': _total(
+            f1099['federal_income_tax_withheld'],
+            _total(w2['federal_income_tax_withheld'])),
+        'social_security_wages': _total(w2['social_security_wages']),
+        'social_security_tax_withheld': _total(w2['social_security_tax_withheld']),
+        'medicare_wages': _total(w2['medicare_wages']),
+        'medicare_tax_withheld': _total(w2['medicare_tax_withheld']),
+        'hsa': _total(w2['hsa']),
+        'ca_sdi': _total(w2['ca_sdi']),
+        'ca_vpdi': _total(w2['ca_vpdi']),
+        'state_wages': _total(w2['state_wages']),
+        'state_income_tax_withheld': _total(w2['state_income_tax_withheld']),
+
+        'interests': _total(f1099['interests']),
+        'dividends': _total(f1099['dividends']),
+        'qualified_dividends': _total(f1099['qualified_dividends']),
+        'unrecaptured_1250_gain': _total(f1099['unrecaptured_1250_gain']),
+        'section_199A_dividends': _total(f1099['section_199A_dividends']),
+        'foreign_tax_paid': _total(f1099['foreign_tax_paid']),
+        'private_activity_bond_interest_dividends': _total(f1099['private_activity_bond_interest_dividends']),
+        'short_term_capital_gain': _total(f1099['short_term_capital_gain']),
+        'long_term_capital_gain': _total(_add(
+            f1099['long_term_capital_gain'], f1099['capital_gain_distributions'])),
+        'misc_income': _total(f1099['misc']),
+        'roth_conversion_gain': _total(f1099['roth_conversion_gain']),
+    }
+
+    if _is_portfolio(real_estates):
+        portfolio = real_estates.totals()
+        totals['primary_home_taxes'] = portfolio['primary_home_taxes']
+        totals['primary_home_interests'] = portfolio['primary_home_interests']
+        totals['rental_incomes'] = list(real_estates.incomes.items())
+        totals['rental_income'] = portfolio['rental_income']
+    else:
+        _aggregate_real_estates(columnize(real_estates, RealEstate), totals)
+
+    totals['k1_income'] = 0
+    if form_k1s is not None:
+        totals['k1_income'] = _total(columnize(form_k1s, FormK1)['income'])
+
+    return totals
+
+
+def aggregate_household(
+        year,
+        form_w2s,
+        form_1099s,
+        real_estates,
+        form_k1s=None,
+        capital_loss_carryover=0,
+        rental_loss_carryover=0,
+        state_tax_adjustments_for_previous_return=0,
+        state_estimated_tax_paid_in_last_year_for_previous_return=0,
+        investment_income_modification=0,
+        car_registration=0,
+        other_taxes=0,
+        gifts=0,
+        state_593=0,
+        federal_estimated_tax_paid=0,
+        state_estimated_tax_paid_in_last_year_for_current_return=0,
+        state_estimated_tax_paid_in_this_year_for_current_return=0,
+        penalty=0,
+        *args, **kwargs):
+    """Aggregated inputs of a household given as TaxComputer keyword
+    arguments: every name in defs.fields_aggregate, plus rental_incomes."""
+    totals = aggregate_forms(form_w2s, form_1099s, real_estates, form_k1s)
+    if _is_portfolio(real_estates):
+        if rental_loss_carryover:
+            raise ValueError(
+                "rental_loss_carryover is given by the RentalPortfolio's carryovers")
+        rental_loss_carryover = real_estates.rental_loss_carryover
+    totals.update(
+        year=year,
+        capital_loss_carryover=capital_loss_carryover,
+        rental_loss_carryover=rental_loss_carryover,
+        taxable_state_refund=max(0, -state_tax_adjustments_for_previous_return),
+        state_tax_due_last_year=max(0, state_tax_adjustments_for_previous_return),
+        state_estimated_tax_paid_in_last_year_for_previous_return=state_estimated_tax_paid_in_last_year_for_previous_return,
+        investment_income_modification=investment_income_modification,
+        car_registration=car_registration,
+        other_taxes=other_taxes,
+        gifts=gifts,
+        state_593=state_593,
+        federal_estimated_tax_paid=federal_estimated_tax_paid,
+        state_estimated_tax_paid_in_last_year_for_current_return=state_estimated_tax_paid_in_last_year_for_current_return,
+        state_estimated_tax_paid_in_this_year_for_current_return=state_estimated_tax_paid_in_this_year_for_current_return,
+        penalty=penalty,
+    )
+    return totals
+
+
+def _aggregate_real_estates(real_estate, totals):
+    is_primary = real_estate['is_primary']
+    if _is_array(is_primary):
+        is_primary = is_primary.astype(bool)
+        is_rental = ~is_primary
+    else:
+        is_rental = list(map(operator.not_, is_primary))
+    primary_homes = _select(real_estate, is_primary)
+    totals['primary_home_taxes'] = _total(primary_homes['taxes'])
+    totals['primary_home_interests'] = _total(primary_homes['interests'])
+
+    rentals = _select(real_estate, is_rental)
+    incomes = _rental_incomes(rentals)
+    totals['rental_incomes'] = list(zip(
+        rentals['id'], incomes.tolist() if _is_array(incomes) else incomes))
+    totals['rental_income'] = _total(incomes)
+
+
+def _is_portfolio(real_estates):
+    module = sys.modules.get('rental_portfolio')
+    return module is not None and isinstance(real_estates, module.RentalPortfolio)
+
+
+def _is_array(column):
+    # Columns can only be arrays once numpy is imported, so records alone
+    # never pay for importing it.
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(column, np.ndarray)
+
+
+def _total(column, start=0):
+    if _is_array(column):
+        return start + column.sum().item()
+    return sum(column, start)
+
+
+def _add(a, b):
+    if _is_array(a):
+        return a + b
+    return list(map(operator.add, a, b))
+
+
+def _select(columns, mask):
+    if _is_array(mask):
+        return {field: column[mask] for field, column in columns.items()}
+    return {
+        field: list(itertools.compress(column, mask))
+        for field, column in columns.items()}
+
+
+def _rental_incomes(rentals):
+    expenses = [rentals[field] for field in RENTAL_EXPENSES]
+    if _is_array(rentals['rents']):
+        total = 0
+        for expense in expenses:
+            total = total + expense
+        return rentals['rents'] - total
+    return list(map(operator.sub, rentals['rents'], map(sum, zip(*expenses))))
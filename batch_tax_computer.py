@@ -0,0 +1,466 @@
+from abc import ABC, abstractmethod
+from functools import cached_property
+
+import numpy as np
+
+from aggregator import aggregate_household
+from defs import fields_aggregate
+from tax_computer import TaxComputer
+from federal_tax_computer import FederalTaxComputer
+from federal_tax_table import regular_tax_table, amt_tax_table
+from state_tax_table import state_tax_table
+
+
+class BatchTaxComputer(ABC):
+    """Column-wise counterpart of TaxComputer.
+
+    Every input is an array with one entry per household, named after the
+    aggregated attributes TaxComputer.__init__ derives (see
+    defs.fields_aggregate). Each derived quantity mirrors the scalar
+    computation operation by operation, so results are identical to the
+    scalar classes, not just close.
+    """
+
+    CAPITAL_LOSS_LIMIT = TaxComputer.CAPITAL_LOSS_LIMIT
+
+    def __init__(self, columns):
+        self.year = np.asarray(columns['year'], dtype=np.int64)
+        size = len(self.year)
+        for name in fields_aggregate[1:]:
+            setattr(self, name, self.column(columns.get(name, 0), size))
+
+        self.years = {
+            int(year): np.flatnonzero(self.year == year)
+            for year in np.unique(self.year)}
+
+
+    @staticmethod
+    def column(values, size):
+        """Input column of `size` households from an array or a scalar."""
+        column = np.asarray(values, dtype=np.float64)
+        if column.ndim == 0:
+            column = np.full(size, column)
+        return column
+
+
+    def gather(self, table):
+        """Per-household parameters from a year-keyed table.
+
+        Numeric fields become arrays; bracket lists stay keyed by year.
+        """
+        any_params = next(iter(table.values()))
+        fields = {}
+        for field in any_params._fields:
+            values = {year: getattr(table[year], field) for year in self.years}
+            if isinstance(getattr(any_params, field), (int, float)):
+                column = np.empty(len(self.year))
+                for year, rows in self.years.items():
+                    column[rows] = values[year]
+                values = column
+            fields[field] = values
+        return type(any_params)(**fields)
+
+
+    @cached_property
+    def capital_gain(self):
+        return np.maximum(
+            self.CAPITAL_LOSS_LIMIT,
+            self.short_term_capital_gain + self.long_term_capital_gain - self.capital_loss_carryover)
+
+
+    @cached_property
+    def rental_income_offset(self):
+        return np.maximum(
+            0,
+            self.rental_income - self.rental_loss_carryover)
+
+
+    @cached_property
+    def agi(self):
+        return (
+            self.w2
+            + self.interests
+            + self.dividends
+            + self.capital_gain
+            + self.misc_income
+            + self.rental_income_offset
+            + self.k1_income
+            + self.taxable_state_refund
+            + self.roth_conversion_gain)
+
+
+    def apply_tax_brackets(self, brackets, amount):
+        tax = np.zeros_like(amount)
+        for year, rows in self.years.items():
+            tax[rows] = self._apply_tax_brackets(brackets[year], amount[rows])
+        return tax
+
+
+    @staticmethod
+    def _apply_tax_brackets(brackets, amount):
+        boundaries = np.array(brackets.boundaries, dtype=np.float64)
+        i = np.searchsorted(boundaries, amount, side='left') - 1
+        j = np.maximum(i, 0)
+        tax = (
+            np.array(brackets.cumulative)[j]
+            + (amount - boundaries[j]) * np.array(brackets.taxrates)[j])
+        return np.where(i < 0, 0, tax)
+
+
+    @abstractmethod
+    def params(self):
+        pass
+
+
+    @abstractmethod
+    def exemption(self):
+        pass
+
+
+    @abstractmethod
+    def taxable_income(self):
+        pass
+
+
+    @abstractmethod
+    def tax(self):
+        pass
+
+
+class BatchFederalTaxComputer(BatchTaxComputer):
+
+    UNRECAPTURED_1250_TAXRATE = FederalTaxComputer.UNRECAPTURED_1250_TAXRATE
+
+    @cached_property
+    def state_local_income_taxes(self):
+        return (
+            self.state_income_tax_withheld
+            + self.state_593
+            + self.ca_sdi
+            + self.state_tax_due_last_year
+            + self.state_estimated_tax_paid_in_last_year_for_previous_return
+            + self.state_estimated_tax_paid_in_last_year_for_current_return)
+
+
+    @cached_property
+    def credits(self):
+        return np.where(self.year < 2018, self.foreign_tax_paid, 0)
+
+
+    def compute_tax_with_qdcg(self, taxable_income):
+
+        def get_qdcg_tax(thresholds, taxable_income, qdcg):
+            qdcg = np.minimum(taxable_income, qdcg)
+            tax = np.zeros_like(taxable_income)
+            for year, rows in self.years.items():
+                brackets = thresholds[year].brackets
+                tax[rows] = (
+                    self._apply_tax_brackets(brackets, taxable_income[rows])
+                    - self._apply_tax_brackets(brackets, taxable_income[rows] - qdcg[rows]))
+            return tax
+
+        tax = self.apply_tax_brackets(self.params.brackets, taxable_income)
+
+        qdcg = self.qualified_dividends + np.where(
+            (self.capital_gain > 0) & (self.long_term_capital_gain > 0),
+            np.minimum(self.capital_gain, self.long_term_capital_gain),
+            0)
+        qdcg = qdcg - self.unrecaptured_1250_gain
+        taxable_income = taxable_income - self.unrecaptured_1250_gain
+        tax_qdcg = (
+            self.apply_tax_brackets(self.params.brackets, np.maximum(0, taxable_income - qdcg))
+            + get_qdcg_tax(self.params.qdcg_thresholds, taxable_income, qdcg))
+        tax_qdcg = tax_qdcg + self.unrecaptured_1250_gain * self.UNRECAPTURED_1250_TAXRATE
+
+        return np.where(qdcg > 0, np.minimum(tax, tax_qdcg), tax)
+
+
+    @cached_property
+    def tax(self):
+        return self.compute_tax_with_qdcg(np.maximum(0, self.taxable_income - self.exemption))
+
+
+class BatchRegularTaxComputer(BatchFederalTaxComputer):
+
+    @cached_property
+    def params(self):
+        return self.gather(regular_tax_table)
+
+
+    @cached_property
+    def exemption(self):
+        excess = np.maximum(0, self.agi - self.params.limit_threshold)
+        return self.params.exemption * (1 - np.minimum(1, np.ceil(excess / 2500) * 0.02))
+
+
+    @cached_property
+    def state_local_taxes(self):
+        state_local_taxes = (
+            self.state_local_income_taxes
+            + self.primary_home_taxes
+            + self.car_registration)
+        return np.where(
+            (self.year >= 2018) & (state_local_taxes > 10000), 10000, state_local_taxes)
+
+
+    @cached_property
+    def qualified_business_income(self):
+        return np.where(
+            self.year >= 2018,
+            0.2 * (np.maximum(self.rental_income, 0) + self.section_199A_dividends),
+            0)
+
+
+    @cached_property
+    def itemized_deduction(self):
+        tentative_deduction = (
+            self.state_local_taxes
+            + self.other_taxes
+            + np.where(self.year >= 2018, self.foreign_tax_paid, 0)
+            + self.primary_home_interests
+            + self.gifts)
+
+        limit = np.minimum(
+            0.03 * np.maximum(0, self.agi - self.params.limit_threshold),
+            tentative_deduction * 0.8,
+        )
+
+        return tentative_deduction - limit
+
+
+    @cached_property
+    def taxable_income(self):
+        return np.maximum(
+            0,
+            self.agi
+            - np.maximum(self.params.standard_deduction, self.itemized_deduction)
+            - self.qualified_business_income)
+
+
+    @cached_property
+    def additional_medicare_tax(self):
+        threshold_on_w2 = 200000
+        taxrate = 0.009
+
+        return taxrate * np.maximum(0, self.medicare_wages - threshold_on_w2)
+
+
+    @cached_property
+    def net_investment_income_tax(self):
+        threshold_on_agi = 200000
+        taxrate = 0.038
+
+        investment_income = (
+            self.interests
+            + self.dividends
+            + self.rental_income_offset
+            + self.k1_income
+            + self.capital_gain
+            + self.investment_income_modification)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = _round(investment_income / self.agi, 4)
+        allocable_state_local_income_taxes = self.state_local_income_taxes * ratio
+        allocable_state_local_income_taxes = np.where(
+            (self.year >= 2018) & (allocable_state_local_income_taxes > 10000),
+            10000,
+            allocable_state_local_income_taxes)
+
+        taxable_investment = investment_income - allocable_state_local_income_taxes
+        return taxrate * np.minimum(taxable_investment, np.maximum(0, self.agi - threshold_on_agi))
+
+
+    @cached_property
+    def excess_social_security(self):
+        return np.maximum(0,
+            self.social_security_tax_withheld
+            - self.params.social_security_taxrate * np.minimum(
+                self.params.social_security_max_wage,
+                self.social_security_wages))
+
+
+    @cached_property
+    def tax_withheld(self):
+        medicare_taxrate = 0.0145
+        medicare_tax = self.medicare_wages * medicare_taxrate
+        medicare_withheld = self.medicare_tax_withheld - medicare_tax
+        return (
+            self.federal_income_tax_withheld
+            + medicare_withheld
+            + self.excess_social_security
+            + self.federal_estimated_tax_paid)
+
+
+class BatchAMTTaxComputer(BatchFederalTaxComputer):
+
+    @cached_property
+    def params(self):
+        return self.gather(amt_tax_table)
+
+
+    @cached_property
+    def exemption(self):
+        excess = np.maximum(0, self.taxable_income - self.params.limit_threshold)
+        return np.maximum(0, self.params.exemption - excess * 0.25)
+
+
+    @cached_property
+    def itemized_deduction(self):
+        return (
+            self.primary_home_interests
+            + self.gifts)
+
+
+    @cached_property
+    def taxable_income(self):
+        return np.maximum(
+            0,
+            self.agi
+            - self.taxable_state_refund
+            + self.private_activity_bond_interest_dividends
+            - self.itemized_deduction
+        )
+
+
+class BatchStateTaxComputer(BatchTaxComputer):
+
+    @cached_property
+    def ca_adjusted_agi(self):
+        return (
+            self.agi
+            - self.taxable_state_refund
+            + self.hsa)
+
+
+    @cached_property
+    def params(self):
+        return self.gather(state_tax_table)
+
+
+    @cached_property
+    def exemption(self):
+        excess = np.maximum(0, self.agi - self.params.limit_threshold)
+        return np.maximum(0, self.params.exemption - np.ceil(excess / 2500) * 6)
+
+
+    @cached_property
+    def itemized_deduction(self):
+        tentative_deduction = (
+            self.primary_home_taxes +
+            self.car_registration +
+            self.other_taxes +
+            self.primary_home_interests +
+            self.gifts)
+
+        limit = np.minimum(
+            0.06 * np.maximum(0, self.agi - self.params.limit_threshold),
+            tentative_deduction * 0.8,
+        )
+        return tentative_deduction - limit
+
+
+    @cached_property
+    def taxable_income(self):
+        return np.maximum(
+            0,
+            self.ca_adjusted_agi
+            - np.maximum(self.params.standard_deduction, self.itemized_deduction)
+        )
+
+
+    @cached_property
+    def tax(self):
+        tax = self.apply_tax_brackets(self.params.brackets, self.taxable_income)
+        return np.maximum(0, tax - self.exemption)
+
+
+    @cached_property
+    def mental_health_services_tax(self):
+        threshold = 1000000
+        taxrate = 0.01
+
+        return taxrate * np.maximum(0, self.taxable_income - threshold)
+
+
+    @cached_property
+    def excess_sdi_vpdi(self):
+        return np.maximum(0,
+            self.ca_sdi + self.ca_vpdi
+            - self.params.ca_sdi_vpdi_taxrate * np.minimum(
+                self.params.ca_sdi_vpdi_max_wage,
+                self.state_wages))
+
+
+    @cached_property
+    def tax_withheld(self):
+        return (
+            self.state_income_tax_withheld
+            + self.state_593
+            + self.excess_sdi_vpdi
+            + self.state_estimated_tax_paid_in_last_year_for_current_return
+            + self.state_estimated_tax_paid_in_this_year_for_current_return)
+
+
+def _round(values, ndigits):
+    """np.round that agrees with the builtin round() on every element.
+
+    np.round scales, rounds and unscales, which can land on the other side of
+    a tie than Python's correctly rounded round(); those few elements are
+    redone with the builtin.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ties:
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+def columns_from_households(households):
+    """Aggregated input columns for keyword dicts accepted by TaxComputer."""
+    totals = [aggregate_household(**household) for household in households]
+    return {
+        name: np.array([t[name] for t in totals])
+        for name in fields_aggregate}
+
+
+COMPUTERS = (BatchRegularTaxComputer, BatchAMTTaxComputer, BatchStateTaxComputer)
+
+
+def compute_batch(columns, computers=COMPUTERS):
+    """Tax results for every household in columns, as a dict of arrays
+    keyed by defs.fields_result."""
+    rtc, atc, stc = (computer(columns) for computer in computers)
+    for computer in (atc, stc):
+        computer.__dict__.update(
+            capital_gain=rtc.capital_gain,
+            rental_income_offset=rtc.rental_income_offset,
+            agi=rtc.agi)
+
+    return {
+        'year': rtc.year,
+        'agi': rtc.agi,
+        'regular_tax': rtc.tax,
+        'amt_tax': atc.tax,
+        'amt': np.maximum(0, atc.tax - rtc.tax),
+        'additional_medicare_tax': rtc.additional_medicare_tax,
+        'net_investment_income_tax': rtc.net_investment_income_tax,
+        'credits': rtc.credits,
+        'federal_tax_withheld': rtc.tax_withheld,
+        'penalty': rtc.penalty,
+        'federal_tax_due': (
+            np.maximum(rtc.tax, atc.tax)
+            + rtc.additional_medicare_tax
+            + rtc.net_investment_income_tax
+            - rtc.credits
+            - rtc.tax_withheld
+            + rtc.penalty),
+        'ca_adjusted_agi': stc.ca_adjusted_agi,
+        'state_tax': stc.tax,
+        'mental_health_services_tax': stc.mental_health_services_tax,
+        'state_tax_withheld': stc.tax_withheld,
+        'state_tax_due': (
+            stc.tax
+            + stc.mental_health_services_tax
+            - stc.tax_withheld),
+    }
@@ -0,0 +1,52 @@
+"""Microbenchmark of bracket application: the bracket walk tax_computer used
+to do against the compiled TaxBrackets lookup.
+
+Run with `python3 -m benchmarks.bench_brackets`.
+"""
+import argparse
+import random
+import timeit
+
+from federal_tax_table import regular_tax_table
+from state_tax_table import state_tax_table
+
+
+def walk_tax_brackets(brackets, amount):
+    tax = 0
+    for boundary, taxrate in reversed(brackets):
+        if amount > boundary:
+            excess = amount - boundary
+            tax += excess * taxrate
+            amount -= excess
+    return tax
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='lookups per schedule')
+    parser.add_argument('-y', '--year', type=int, default=max(regular_tax_table),
+                        help='tax year of the schedules')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    amounts = [rng.uniform(0, 1000000) for _ in range(args.number)]
+
+    schedules = (
+        ('regular', regular_tax_table[args.year].brackets),
+        ('state', state_tax_table[args.year].brackets),
+    )
+    for name, brackets in schedules:
+        plain = list(brackets)
+        walk = min(timeit.repeat(
+            lambda: [walk_tax_brackets(plain, a) for a in amounts], number=1, repeat=5))
+        compiled = min(timeit.repeat(
+            lambda: [brackets.apply(a) for a in amounts], number=1, repeat=5))
+        print(f"{name} ({len(brackets)} brackets): "
+              f"walk {walk / args.number * 1e9:.0f} ns, "
+              f"compiled {compiled / args.number * 1e9:.0f} ns, "
+              f"speedup {walk / compiled:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Benchmark suite over synthetic households.
+
+    python3 -m benchmarks.run -n 2000 -o before.json
+    python3 -m benchmarks.run -n 2000 -o after.json
+    python3 -m benchmarks.run --compare before.json after.json
+
+Every case reports households per second and, where households are
+computed one call at a time, per-call latency percentiles.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from batch_tax_computer import columns_from_households, compute_batch
+from cents import compute_household_cents, compute_batch_cents, columns_from_households_cents
+from federal_tax_computer import RegularTaxComputer, AMTTaxComputer
+from household import compute_household, compute_many
+from household_reader import household_to_json
+from household_store import write_store, compute_store
+from state_tax_computer import StateTaxComputer
+from synthetic import PROFILES, generate_households
+from tax_server import make_server, TaxClient
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERCENTILES = (50, 90, 99)
+
+
+def time_calls(function, households):
+    """Time function on each household separately."""
+    latencies = []
+    for household in households:
+        start = time.perf_counter()
+        function(household)
+        latencies.append(time.perf_counter() - start)
+    return summarize(len(households), sum(latencies), latencies)
+
+
+def time_batch(function, households, repeat=3):
+    """Time calls of function on all households at once, keeping the best
+    of `repeat` so that one-off warm-up costs are left out."""
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(households)
+        elapsed.append(time.perf_counter() - start)
+    return summarize(len(households), min(elapsed))
+
+
+def summarize(count, elapsed, latencies=None):
+    summary = {
+        'households': count,
+        'seconds': elapsed,
+        'households_per_sec': count / elapsed if elapsed else float('inf'),
+    }
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        summary['latency_us'] = {
+            f"p{p}": quantiles[p - 1] * 1e6 for p in PERCENTILES}
+    return summary
+
+
+def run(n, seed, workers):
+    households = generate_households(n, seed)
+    results = {}
+
+    for name, computer in (
+            ('regular', RegularTaxComputer),
+            ('amt', AMTTaxComputer),
+            ('state', StateTaxComputer)):
+        results[f"scalar.{name}"] = time_calls(lambda h: computer(**h).tax, households)
+
+    results['scalar.household'] = time_calls(compute_household, households)
+    results['scalar.household.cents'] = time_calls(compute_household_cents, households)
+    for profile in PROFILES:
+        results[f"scalar.household.{profile}"] = time_calls(
+            compute_household, generate_households(n // len(PROFILES) or 1, seed, profile))
+
+    results['batch.aggregate'] = time_batch(columns_from_households, households)
+    columns = columns_from_households(households)
+    results['batch.compute'] = time_batch(compute_batch, columns)
+    results['batch.compute.cents'] = time_batch(
+        compute_batch_cents, columns_from_households_cents(households))
+    results['compute_many'] = time_batch(
+        lambda h: list(compute_many(h, workers=workers)), households, repeat=1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = os.path.join(directory, 'store')
+        write_store(store, households)
+        results['store.compute'] = time_batch(
+            lambda _: compute_store(store, workers=1), households)
+
+        path = os.path.join(directory, 'households.jsonl')
+        write_jsonl(path, households)
+        results['tax.py'] = time_batch(
+            lambda _: subprocess.run(
+                [sys.executable, os.path.join(ROOT, 'tax.py'), path],
+                check=True, cwd=ROOT, stdout=subprocess.DEVNULL),
+            households, repeat=1)
+
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = TaxClient(f"http://127.0.0.1:{server.server_address[1]}")
+        results['server.compute'] = time_calls(client.compute, households)
+        results['server.compute_many'] = time_batch(client.compute_many, households)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+
+def write_jsonl(path, households):
+    with open(path, 'w') as f:
+        for i, household in enumerate(households):
+            f.write(json.dumps({'household': i, **household_to_json(household)}) + '\n')
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before, after):
+    with open(before) as f:
+        before = json.load(f)
+    with open(after) as f:
+        after = json.load(f)
+    print(f"{'case':32} {before['revision'] or 'before':>14} {after['revision'] or 'after':>14}  speedup")
+    for case, result in after['results'].items():
+        if case not in before['results']:
+            continue
+        old = before['results'][case]['households_per_sec']
+        new = result['households_per_sec']
+        print(f"{case:32} {old:14.0f} {new:14.0f}  {new / old:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--households', type=int, default=2000,
+                        help='synthetic households per case')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-o', '--output',
+                        help='write results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'households': args.households,
+        'seed': args.seed,
+        'workers': args.workers,
+        'results': run(args.households, args.seed, args.workers),
+    }
+    for case, result in report['results'].items():
+        latency = result.get('latency_us')
+        print(f"{case:32} {result['households_per_sec']:12.0f} households/s"
+              + (f"  p50 {latency['p50']:.0f} us  p99 {latency['p99']:.0f} us" if latency else ""))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Cold start time of tax.py.
+
+    python3 -m benchmarks.startup --budget 100
+
+Runs `tax.py demo_data --json` in fresh interpreters, reports the best
+wall time, and from `python -X importtime` the modules that take longest
+to import. Exits with status 1 if the best wall time exceeds the budget
+in milliseconds.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMAND = ['tax.py', 'demo_data', '--json']
+
+
+def wall_time(command, repeat):
+    """Best wall time of running command with this interpreter, in seconds."""
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + command, check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def import_times(command):
+    """{module: (self, cumulative)} import times in microseconds."""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + command,
+        check=True, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=10)
+    parser.add_argument('-b', '--budget', type=float, default=100,
+                        help='maximum wall time in milliseconds')
+    parser.add_argument('-t', '--top', type=int, default=10,
+                        help='number of slowest imports to list')
+    args = parser.parse_args()
+
+    baseline = wall_time(['-c', 'pass'], args.repeat)
+    elapsed = wall_time(COMMAND, args.repeat)
+    times = import_times(COMMAND)
+
+    print(f"{' '.join(COMMAND)}: {elapsed * 1e3:.1f} ms"
+          f" (interpreter alone {baseline * 1e3:.1f} ms, budget {args.budget:.0f} ms)")
+    print(f"{'module':40} {'self ms':>9} {'cum ms':>9}")
+    for module, (own, cumulative) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"{module:40} {own / 1e3:9.1f} {cumulative / 1e3:9.1f}")
+    for module in ('matplotlib', 'numpy'):
+        if module in times:
+            print(f"{module} is imported")
+
+    if elapsed * 1e3 > args.budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
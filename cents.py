@@ -0,0 +1,539 @@
+"""Tax computed in integers, on whole-dollar form lines.
+
+    compute_household_cents(household)       # TaxResult of int cents
+    compute_batch_cents(columns_from_households_cents(households))
+
+The forms are summed as by aggregate_household and every total is taken
+to the cent, which is exact for amounts given in dollars and cents. From
+there the computation follows the IRS and FTB instructions for a return
+in whole dollars: each total is entered on its line rounded to whole
+dollars, half away from zero, and so is each line figured with a rate,
+such as the tax of the Tax Computation Worksheet, the line of each rate
+of the Qualified Dividends and Capital Gain Tax Worksheet, the reduction
+of the exemption, the limit on itemized deductions or the net investment
+income tax. Results are those whole dollars, given in int cents.
+
+Two departures from the instructions: the tax is the worksheet formula
+at every income, where the instructions use the Tax Table below $100,000
+of taxable income, and a line adding several totals, such as the state
+and local income taxes of Schedule A, adds them rounded where the
+instructions round only the sum, which can move it by a dollar.
+
+Rates are integers in millionths, as every rate of the tables is exact
+to 1e-6, and a line is rounded from the exact product, so results do not
+depend on the machine. The computation is one function over Python ints
+for one household, and over int64 columns for many, CHUNKSIZE households
+at a time, with the brackets of every year compiled into padded tables
+and a household's bracket found by counting the boundaries below its
+income; the two variants agree to the cent. Totals must stay within
+LIMIT dollars, about $17 billion, or OverflowError is raised. Both
+variants are faster than the float computers, the scalar one by about
+1.3 times and the batch one by about 1.2 to 1.3 times (see
+benchmarks/run.py).
+"""
+from bisect import bisect_left
+from collections import namedtuple
+
+import math
+
+import numpy as np
+
+from aggregator import aggregate_household
+from batch_tax_computer import columns_from_households
+from defs import TaxResult, fields_aggregate, fields_result
+from tax_tables import load, years
+
+
+PPM = 10 ** 6
+
+# Totals in dollars must stay within LIMIT, so that the sums of all of
+# them stay within SPAN, and any of those times a rate in millionths
+# within int64.
+LIMIT = 2 ** 34
+
+SPAN = 2 ** 41
+
+# Households computed at a time, so that the columns stay in the cache.
+CHUNKSIZE = 8192
+
+# Dollars as floats land a hair off a half cent, 1.005 being
+# 1.00499999999999989..., so amounts that close to it round as the half.
+HALF = 0.5 + 1e-6
+
+# Parameters of a year, in dollars and millionths; the brackets are
+# Brackets for one household and BracketColumns for many.
+Parameters = namedtuple('Parameters', [
+    'regular_brackets',
+    'amt_brackets',
+    'state_brackets',
+    'qdcg_bands',
+    'regular_limit_threshold',
+    'regular_exemption',
+    'standard_deduction',
+    'social_security_max_wage',
+    'social_security_taxrate',
+    'amt_limit_threshold',
+    'amt_exemption',
+    'state_limit_threshold',
+    'state_exemption',
+    'state_standard_deduction',
+    'ca_sdi_vpdi_max_wage',
+    'ca_sdi_vpdi_taxrate',
+])
+
+_years = {}
+_columns = []
+
+
+def to_cents(dollars):
+    """Dollars rounded half away from zero to int cents."""
+    if isinstance(dollars, int):
+        return dollars * 100
+    return int(math.copysign(math.floor(abs(dollars) * 100 + HALF), dollars))
+
+
+def to_dollars(cents):
+    """Whole dollars of cents, rounded half away from zero, as entered on
+    the forms."""
+    dollars, rest = divmod(abs(cents), 100)
+    return int(math.copysign(dollars + (rest >= 50), cents))
+
+
+def array_to_cents(dollars):
+    """Array of dollars rounded half away from zero to int64 cents."""
+    dollars = np.asarray(dollars)
+    if dollars.dtype.kind in 'iu':
+        return dollars.astype(np.int64) * 100
+    return np.trunc(dollars * 100.0 + np.copysign(HALF, dollars)).astype(np.int64)
+
+
+def _ppm(rate):
+    return round(rate * PPM)
+
+
+class Brackets:
+    """Bracket boundaries, rates in millionths and the tax at each
+    boundary in millionths of a dollar, as ints."""
+
+    def __init__(self, brackets):
+        self.boundaries = tuple(min(int(boundary), SPAN) for boundary in brackets.boundaries)
+        self.taxrates = tuple(_ppm(taxrate) for taxrate in brackets.taxrates)
+        cumulative = [0]
+        for lower, upper, taxrate in zip(self.boundaries, self.boundaries[1:], self.taxrates):
+            cumulative.append(cumulative[-1] + (upper - lower) * taxrate)
+        self.cumulative = tuple(cumulative)
+
+
+    def apply(self, amount):
+        i = bisect_left(self.boundaries, amount) - 1
+        if i < 0:
+            return 0
+        return _Ints.round(self.cumulative[i] + (amount - self.boundaries[i]) * self.taxrates[i])
+
+
+class BracketColumns:
+    """Brackets of every year as rows of int64 arrays, padded to the same
+    length with boundaries beyond any amount, for columns of households.
+
+    The bracket of an amount is found by counting the boundaries below
+    it, one comparison per bracket over the whole column, which is faster
+    than a binary search per household.
+    """
+
+    def __init__(self, brackets):
+        size = max(len(b.boundaries) for b in brackets)
+
+        def table(field, padding):
+            return np.array([
+                getattr(b, field) + (padding,) * (size - len(b.boundaries)) for b in brackets],
+                dtype=np.int64)
+
+        self.boundaries = table('boundaries', SPAN)
+        self.taxrates = table('taxrates', 0)
+        self.cumulative = table('cumulative', 0)
+
+
+    def rows(self, index):
+        """These brackets for households of the years at index."""
+        rows = BracketColumns.__new__(BracketColumns)
+        rows.boundaries = self.boundaries.ravel()
+        rows.taxrates = self.taxrates.ravel()
+        rows.cumulative = self.cumulative.ravel()
+        rows.start = index * self.boundaries.shape[1]
+        rows.columns = [column[index] for column in self.boundaries.T]
+        return rows
+
+
+    def apply(self, amount):
+        i = np.full(len(amount), -1, dtype=np.int8)
+        for boundary in self.columns:
+            i += amount > boundary
+        j = self.start + np.maximum(i, 0)
+        tax = _Columns.round(self.cumulative[j] + (amount - self.boundaries[j]) * self.taxrates[j])
+        return np.where(i < 0, 0, tax)
+
+
+def _qdcg_bands(thresholds):
+    """(lower, upper, rate) of each rate of the QDCG worksheet."""
+    boundaries = [min(int(boundary), SPAN) for boundary in thresholds.brackets.boundaries]
+    return tuple(
+        (lower, upper, _ppm(taxrate))
+        for lower, upper, taxrate in zip(boundaries, boundaries[1:], thresholds.brackets.taxrates))
+
+
+def _parameters(year):
+    """Parameters of one year, for one household."""
+    params = _years.get(year)
+    if params is None:
+        regular, amt, state = load(year)
+        params = _years[year] = Parameters(
+            regular_brackets=Brackets(regular.brackets),
+            amt_brackets=Brackets(amt.brackets),
+            state_brackets=Brackets(state.brackets),
+            qdcg_bands=_qdcg_bands(regular.qdcg_thresholds),
+            regular_limit_threshold=min(regular.limit_threshold, SPAN),
+            regular_exemption=regular.exemption,
+            standard_deduction=regular.standard_deduction,
+            social_security_max_wage=regular.social_security_max_wage,
+            social_security_taxrate=_ppm(regular.social_security_taxrate),
+            amt_limit_threshold=min(amt.limit_threshold, SPAN),
+            amt_exemption=amt.exemption,
+            state_limit_threshold=min(state.limit_threshold, SPAN),
+            state_exemption=state.exemption,
+            state_standard_deduction=state.standard_deduction,
+            ca_sdi_vpdi_max_wage=state.ca_sdi_vpdi_max_wage,
+            ca_sdi_vpdi_taxrate=_ppm(state.ca_sdi_vpdi_taxrate))
+    return params
+
+
+def _parameter_columns():
+    """(first year, position of each year from the first in the arrays or
+    -1, Parameters of arrays indexed by position), compiled once."""
+    if not _columns:
+        known = years()
+        params = [_parameters(year) for year in known]
+        columns = {
+            name: np.array([getattr(p, name) for p in params], dtype=np.int64)
+            for name in Parameters._fields[4:]}
+        for name in Parameters._fields[:3]:
+            columns[name] = BracketColumns([getattr(p, name) for p in params])
+        # Years with fewer rates get empty bands.
+        count = max(len(p.qdcg_bands) for p in params)
+        bands = np.array([p.qdcg_bands + ((0, 0, 0),) * (count - len(p.qdcg_bands)) for p in params])
+        columns['qdcg_bands'] = tuple(tuple(bands[:, band].T) for band in range(count))
+        positions = np.full(known[-1] - known[0] + 1, -1)
+        positions[np.array(known) - known[0]] = np.arange(len(known))
+        _columns.append((known[0], positions, Parameters(**columns)))
+    return _columns[0]
+
+
+def _ceil(a, b):
+    """a / b rounded up, of ints or int arrays."""
+    return -(-a // b)
+
+
+class _Ints:
+    """Operations of _compute on the ints of one household."""
+
+    maximum = staticmethod(max)
+    minimum = staticmethod(min)
+
+
+    @staticmethod
+    def where(condition, a, b):
+        return a if condition else b
+
+
+    @staticmethod
+    def round(millionths):
+        """Whole dollars of millionths of a dollar, half away from zero."""
+        dollars = (abs(millionths) + PPM // 2) // PPM
+        return dollars if millionths >= 0 else -dollars
+
+
+    @staticmethod
+    def ratio(a, b):
+        """a / b to 4 decimal places in units of 1e-4, half away from
+        zero; 0 where b is 0."""
+        if not b:
+            return 0
+        quotient = (2 * abs(a) * 10000 + abs(b)) // (2 * abs(b))
+        return quotient if (a >= 0) == (b > 0) else -quotient
+
+
+class _Columns:
+    """Operations of _compute on int64 columns of households."""
+
+    maximum = staticmethod(np.maximum)
+    minimum = staticmethod(np.minimum)
+    where = staticmethod(np.where)
+
+
+    @staticmethod
+    def round(millionths):
+        if millionths.min(initial=0) < 0:
+            # Less one below zero, which rounds the halves there down.
+            dollars = millionths + (PPM // 2 + (millionths >> 63))
+        else:
+            dollars = millionths + PPM // 2
+        dollars //= PPM
+        return dollars
+
+
+    @staticmethod
+    def ratio(a, b):
+        if b.min(initial=1) <= 0:
+            # The sign of b onto a, and 0 / 1 for b of 0.
+            a = np.where(b < 0, -a, np.where(b == 0, 0, a))
+            b = np.where(b == 0, 1, np.abs(b))
+        return (2 * 10000 * a + (b + (a >> 63))) // (2 * b)
+
+
+def _compute(t, p, ops):
+    """{field of TaxResult: whole dollars} from totals t in whole dollars
+    and Parameters p, with ops _Ints or _Columns. Every line mirrors its
+    float computer, rounded where a rate enters."""
+    maximum, minimum, where, dollars = ops.maximum, ops.minimum, ops.where, ops.round
+    post_2017 = t['year'] >= 2018
+
+    capital_gain = maximum(
+        -3000, t['short_term_capital_gain'] + t['long_term_capital_gain'] - t['capital_loss_carryover'])
+    rental_income_offset = maximum(0, t['rental_income'] - t['rental_loss_carryover'])
+    agi = (
+        t['w2']
+        + t['interests']
+        + t['dividends']
+        + capital_gain
+        + t['misc_income']
+        + rental_income_offset
+        + t['k1_income']
+        + t['taxable_state_refund']
+        + t['roth_conversion_gain'])
+    state_local_income_taxes = (
+        t['state_income_tax_withheld']
+        + t['state_593']
+        + t['ca_sdi']
+        + t['state_tax_due_last_year']
+        + t['state_estimated_tax_paid_in_last_year_for_previous_return']
+        + t['state_estimated_tax_paid_in_last_year_for_current_return'])
+
+    def tax_with_qdcg(brackets, taxable_income):
+        # Tax Computation Worksheet, or the QDCG worksheet if less.
+        tax = brackets.apply(taxable_income)
+        unrecaptured_1250_gain = t['unrecaptured_1250_gain']
+        qdcg = (
+            t['qualified_dividends']
+            + where((capital_gain > 0) & (t['long_term_capital_gain'] > 0),
+                    minimum(capital_gain, t['long_term_capital_gain']), 0)
+            - unrecaptured_1250_gain)
+        taxable_income = taxable_income - unrecaptured_1250_gain
+        bottom = taxable_income - minimum(taxable_income, qdcg)
+        tax_qdcg = (
+            brackets.apply(maximum(0, taxable_income - qdcg))
+            + dollars(unrecaptured_1250_gain * _ppm(0.25)))
+        for lower, upper, taxrate in p.qdcg_bands:
+            amount = maximum(0, minimum(taxable_income, upper) - maximum(bottom, lower))
+            tax_qdcg = tax_qdcg + dollars(amount * taxrate)
+        return where(qdcg > 0, minimum(tax, tax_qdcg), tax)
+
+    # Regular tax.
+    excess = maximum(0, agi - p.regular_limit_threshold)
+    exemption = p.regular_exemption - dollars(
+        p.regular_exemption * minimum(PPM, _ceil(excess, 2500) * _ppm(0.02)))
+    state_local_taxes = state_local_income_taxes + t['primary_home_taxes'] + t['car_registration']
+    state_local_taxes = where(post_2017 & (state_local_taxes > 10000), 10000, state_local_taxes)
+    qualified_business_income = post_2017 * dollars(
+        (maximum(t['rental_income'], 0) + t['section_199A_dividends']) * _ppm(0.2))
+    tentative_deduction = (
+        state_local_taxes
+        + t['other_taxes']
+        + post_2017 * t['foreign_tax_paid']
+        + t['primary_home_interests']
+        + t['gifts'])
+    limit = minimum(
+        dollars(maximum(0, agi - p.regular_limit_threshold) * _ppm(0.03)),
+        dollars(tentative_deduction * _ppm(0.8)))
+    taxable_income = maximum(
+        0,
+        agi
+        - maximum(p.standard_deduction, tentative_deduction - limit)
+        - qualified_business_income)
+    regular_tax = tax_with_qdcg(p.regular_brackets, maximum(0, taxable_income - exemption))
+
+    additional_medicare_tax = dollars(maximum(0, t['medicare_wages'] - 200000) * _ppm(0.009))
+    investment_income = (
+        t['interests']
+        + t['dividends']
+        + rental_income_offset
+        + t['k1_income']
+        + capital_gain
+        + t['investment_income_modification'])
+    allocable = dollars(state_local_income_taxes * ops.ratio(investment_income, agi) * 100)
+    allocable = where(post_2017 & (allocable > 10000), 10000, allocable)
+    net_investment_income_tax = dollars(
+        minimum(investment_income - allocable, maximum(0, agi - 200000)) * _ppm(0.038))
+    excess_social_security = maximum(
+        0,
+        t['social_security_tax_withheld']
+        - dollars(minimum(p.social_security_max_wage, t['social_security_wages']) * p.social_security_taxrate))
+    federal_tax_withheld = (
+        t['federal_income_tax_withheld']
+        + t['medicare_tax_withheld'] - dollars(t['medicare_wages'] * _ppm(0.0145))
+        + excess_social_security
+        + t['federal_estimated_tax_paid'])
+    credits = (1 - post_2017) * t['foreign_tax_paid']
+
+    # AMT.
+    amt_taxable_income = maximum(
+        0,
+        agi
+        - t['taxable_state_refund']
+        + t['private_activity_bond_interest_dividends']
+        - (t['primary_home_interests'] + t['gifts']))
+    amt_exemption = maximum(
+        0, p.amt_exemption - dollars(maximum(0, amt_taxable_income - p.amt_limit_threshold) * _ppm(0.25)))
+    amt_tax = tax_with_qdcg(p.amt_brackets, maximum(0, amt_taxable_income - amt_exemption))
+
+    # State tax.
+    ca_adjusted_agi = agi - t['taxable_state_refund'] + t['hsa']
+    state_excess = maximum(0, agi - p.state_limit_threshold)
+    state_exemption = maximum(0, p.state_exemption - _ceil(state_excess, 2500) * 6)
+    state_tentative_deduction = (
+        t['primary_home_taxes']
+        + t['car_registration']
+        + t['other_taxes']
+        + t['primary_home_interests']
+        + t['gifts'])
+    state_limit = minimum(
+        dollars(maximum(0, agi - p.state_limit_threshold) * _ppm(0.06)),
+        dollars(state_tentative_deduction * _ppm(0.8)))
+    state_taxable_income = maximum(
+        0,
+        ca_adjusted_agi - maximum(p.state_standard_deduction, state_tentative_deduction - state_limit))
+    state_tax = maximum(0, p.state_brackets.apply(state_taxable_income) - state_exemption)
+    mental_health_services_tax = dollars(maximum(0, state_taxable_income - 1000000) * _ppm(0.01))
+    excess_sdi_vpdi = maximum(
+        0,
+        t['ca_sdi'] + t['ca_vpdi']
+        - dollars(minimum(p.ca_sdi_vpdi_max_wage, t['state_wages']) * p.ca_sdi_vpdi_taxrate))
+    state_tax_withheld = (
+        t['state_income_tax_withheld']
+        + t['state_593']
+        + excess_sdi_vpdi
+        + t['state_estimated_tax_paid_in_last_year_for_current_return']
+        + t['state_estimated_tax_paid_in_this_year_for_current_return'])
+
+    return {
+        'year': t['year'],
+        'agi': agi,
+        'regular_tax': regular_tax,
+        'amt_tax': amt_tax,
+        'amt': maximum(0, amt_tax - regular_tax),
+        'additional_medicare_tax': additional_medicare_tax,
+        'net_investment_income_tax': net_investment_income_tax,
+        'credits': credits,
+        'federal_tax_withheld': federal_tax_withheld,
+        'penalty': t['penalty'],
+        'federal_tax_due': (
+            maximum(regular_tax, amt_tax)
+            + additional_medicare_tax
+            + net_investment_income_tax
+            - credits
+            - federal_tax_withheld
+            + t['penalty']),
+        'ca_adjusted_agi': ca_adjusted_agi,
+        'state_tax': state_tax,
+        'mental_health_services_tax': mental_health_services_tax,
+        'state_tax_withheld': state_tax_withheld,
+        'state_tax_due': state_tax + mental_health_services_tax - state_tax_withheld,
+    }
+
+
+def compute_household_cents(household):
+    """TaxResult of household, TaxComputer keyword arguments in dollars,
+    with every amount in int cents."""
+    t = whole_dollar_totals(household)
+    result = _compute(t, _parameters(t['year']), _Ints)
+    return TaxResult(result['year'], *(dollars * 100 for dollars in list(result.values())[1:]))
+
+
+def whole_dollar_totals(household):
+    """Totals of household, as aggregate_household, each taken to the cent
+    and rounded to int whole dollars as entered on the forms."""
+    totals = aggregate_household(**household)
+    for name in fields_aggregate[1:]:
+        total = totals[name]
+        if total:
+            dollars = (math.floor(abs(total) * 100 + HALF) + 50) // 100
+            if dollars > LIMIT:
+                raise OverflowError(f"{name} is beyond {LIMIT} dollars")
+            totals[name] = dollars if total > 0 else -dollars
+        else:
+            totals[name] = 0
+    return totals
+
+
+def columns_from_households_cents(households):
+    """Aggregated input columns for TaxComputer keyword dicts, in int64
+    cents."""
+    return columns_to_cents(columns_from_households(households))
+
+
+def columns_to_cents(columns):
+    """Input columns in dollars, as from columns_from_households, in int64
+    cents."""
+    return {
+        name: column if name == 'year' else array_to_cents(column)
+        for name, column in columns.items()}
+
+
+def compute_batch_cents(columns, chunksize=CHUNKSIZE):
+    """Tax results for int64 columns of cents, as a dict of arrays keyed by
+    defs.fields_result; every result but year is int64 cents. Households
+    are computed `chunksize` at a time."""
+    first, positions, params = _parameter_columns()
+    year = np.asarray(columns['year'], dtype=np.int64)
+    offset = year - first
+    if offset.size and (offset.min() < 0 or offset.max() >= len(positions)):
+        raise KeyError(int(year[(offset < 0) | (offset >= len(positions))][0]))
+    index = positions[offset]
+    if index.min(initial=0) < 0:
+        raise KeyError(int(year[index < 0][0]))
+
+    cents = {}
+    for name in fields_aggregate[1:]:
+        column = np.asarray(columns.get(name, 0))
+        if column.dtype.kind not in 'iu':
+            raise TypeError(f"cents columns must be integers, not {column.dtype}")
+        cents[name] = np.broadcast_to(column, year.shape).astype(np.int64, copy=False)
+
+    results = {field: np.empty(len(year), dtype=np.int64) for field in fields_result}
+    for start in range(0, len(year), chunksize):
+        rows = slice(start, start + chunksize)
+        chunk = _compute(_dollar_columns(year[rows], cents, rows), _parameter_rows(params, index[rows]), _Columns)
+        results['year'][rows] = chunk['year']
+        for field in fields_result[1:]:
+            np.multiply(chunk[field], 100, out=results[field][rows])
+    return results
+
+
+def _dollar_columns(year, cents, rows):
+    """Totals of rows of the cents columns, in whole dollars."""
+    t = {'year': year}
+    for name, column in cents.items():
+        column = column[rows]
+        low, high = column.min(initial=0), column.max(initial=0)
+        if max(high, -low) > LIMIT * 100:
+            raise OverflowError(f"{name} is beyond {LIMIT} dollars")
+        dollars = column + (50 + (column >> 63) if low < 0 else 50)
+        dollars //= 100
+        t[name] = dollars
+    return t
+
+
+def _parameter_rows(params, index):
+    """Parameters of arrays for households of the years at index."""
+    return params._replace(
+        **{name: getattr(params, name).rows(index) for name in Parameters._fields[:3]},
+        qdcg_bands=tuple(tuple(column[index] for column in band) for band in params.qdcg_bands),
+        **{name: getattr(params, name)[index] for name in Parameters._fields[4:]})
@@ -74,4 +74,71 @@ FormK1 = namedtuple(
     'FormK1',
     fields_k1,
     defaults=('', 0)
-)
\ No newline at end of file
+)
+
+fields_aggregate = (
+    'year',
+    'w2',
+    'federal_income_tax_withheld',
+    'social_security_wages',
+    'social_security_tax_withheld',
+    'medicare_wages',
+    'medicare_tax_withheld',
+    'hsa',
+    'ca_sdi',
+    'ca_vpdi',
+    'state_wages',
+    'state_income_tax_withheld',
+    'interests',
+    'dividends',
+    'qualified_dividends',
+    'unrecaptured_1250_gain',
+    'section_199A_dividends',
+    'foreign_tax_paid',
+    'private_activity_bond_interest_dividends',
+    'short_term_capital_gain',
+    'long_term_capital_gain',
+    'misc_income',
+    'roth_conversion_gain',
+    'primary_home_taxes',
+    'primary_home_interests',
+    'rental_income',
+    'k1_income',
+    'capital_loss_carryover',
+    'rental_loss_carryover',
+    'taxable_state_refund',
+    'state_tax_due_last_year',
+    'state_estimated_tax_paid_in_last_year_for_previous_return',
+    'investment_income_modification',
+    'car_registration',
+    'other_taxes',
+    'gifts',
+    'state_593',
+    'federal_estimated_tax_paid',
+    'state_estimated_tax_paid_in_last_year_for_current_return',
+    'state_estimated_tax_paid_in_this_year_for_current_return',
+    'penalty',
+)
+
+
+fields_result = (
+    'year',
+    'agi',
+    'regular_tax',
+    'amt_tax',
+    'amt',
+    'additional_medicare_tax',
+    'net_investment_income_tax',
+    'credits',
+    'federal_tax_withheld',
+    'penalty',
+    'federal_tax_due',
+    'ca_adjusted_agi',
+    'state_tax',
+    'mental_health_services_tax',
+    'state_tax_withheld',
+    'state_tax_due',
+)
+TaxResult = namedtuple(
+    'TaxResult',
+    fields_result)
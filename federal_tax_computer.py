@@ -1,10 +1,10 @@
 from functools import cached_property
 
-import logging
 import math
 
 from tax_computer import TaxComputer
 from federal_tax_table import regular_tax_table, amt_tax_table
+from tracing import tracer
 
 
 class FederalTaxComputer(TaxComputer):
@@ -30,23 +30,9 @@ class FederalTaxComputer(TaxComputer):
 
 
     def compute_tax_with_qdcg(self, taxable_income):
-
-        def _get_qdcg_tax(thresholds, taxable_income, qdcg):
-            tax = 0
-            remaining_qdcg = min(taxable_income, qdcg)
-            for threshold in thresholds:
-                limit = max(0, taxable_income - threshold[0])
-                qualified_qdcg = max(0, remaining_qdcg - limit)
-                tax += qualified_qdcg * threshold[1]
-                logging.debug(
-                    f"applying {threshold[1]} to {remaining_qdcg:.0f}-{limit:.0f}: {tax:.0f} cumulative")
-                remaining_qdcg -= qualified_qdcg
-                if remaining_qdcg == 0:
-                    break
-            return tax
-
         tax = self.apply_tax_brackets(self.params.brackets, taxable_income)
-        logging.debug(f"tax: {tax:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'tax', tax, taxable_income=taxable_income)
 
         qdcg = self.qualified_dividends
         if self.capital_gain > 0 and self.long_term_capital_gain > 0:
@@ -56,12 +42,14 @@ class FederalTaxComputer(TaxComputer):
         if qdcg > 0:
             tax_qdcg = (
                 self.apply_tax_brackets(self.params.brackets, max(0, taxable_income - qdcg))
-                + _get_qdcg_tax(self.params.qdcg_thresholds, taxable_income, qdcg))
+                + self.params.qdcg_thresholds.apply(taxable_income, qdcg))
             unrecaptured_1250_tax = self.unrecaptured_1250_gain * self.UNRECAPTURED_1250_TAXRATE
-            logging.debug(
-                f"applying {self.UNRECAPTURED_1250_TAXRATE} to {self.unrecaptured_1250_gain}: {unrecaptured_1250_tax:.0f}")
             tax_qdcg += unrecaptured_1250_tax
-            logging.debug(f"tax_qdcg: {tax_qdcg:.0f}")
+            if tracer.enabled:
+                tracer.record(self, 'unrecaptured_1250_tax', unrecaptured_1250_tax,
+                    taxrate=self.UNRECAPTURED_1250_TAXRATE,
+                    unrecaptured_1250_gain=self.unrecaptured_1250_gain)
+                tracer.record(self, 'tax_qdcg', tax_qdcg, taxable_income=taxable_income, qdcg=qdcg)
             tax = min(tax, tax_qdcg)
 
         return tax
@@ -82,7 +70,8 @@ class RegularTaxComputer(FederalTaxComputer):
     @cached_property
     def exemption(self):
         excess = max(0, self.agi - self.params.limit_threshold)
-        logging.debug(f"excess = {excess}")
+        if tracer.enabled:
+            tracer.record(self, 'excess', excess, agi=self.agi, limit_threshold=self.params.limit_threshold)
         return self.params.exemption * (1 - min(1, math.ceil(excess / 2500) * 0.02))
 
 
@@ -103,7 +92,10 @@ class RegularTaxComputer(FederalTaxComputer):
         qbi = 0
         if self.year >= 2018:
             qbi = 0.2 * (max(self.rental_income, 0) + self.section_199A_dividends)
-        logging.debug(f"qbi = {qbi:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'qbi', qbi,
+                rental_income=self.rental_income,
+                section_199A_dividends=self.section_199A_dividends)
         return qbi
 
 
@@ -116,20 +108,22 @@ class RegularTaxComputer(FederalTaxComputer):
             + self.primary_home_interests
             + self.gifts)
 
-        logging.debug(f"tentative_deduction = {tentative_deduction:.0f}")
-        logging.debug(f"    state_local_taxes = {self.state_local_taxes:.0f}")
-        logging.debug(f"        state_local_income_taxes = {self.state_local_income_taxes:.0f}")
-        logging.debug(f"        primary_home_taxes = {self.primary_home_taxes:.0f}")
-        logging.debug(f"        car_registration = {self.car_registration:.0f}")
-        logging.debug(f"    other_taxes = {self.other_taxes:.0f}")
-        logging.debug(f"    primary_home_interests = {self.primary_home_interests:.0f}")
-        logging.debug(f"    gifts = {self.gifts:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'tentative_deduction', tentative_deduction,
+                state_local_taxes=self.state_local_taxes,
+                state_local_income_taxes=self.state_local_income_taxes,
+                primary_home_taxes=self.primary_home_taxes,
+                car_registration=self.car_registration,
+                other_taxes=self.other_taxes,
+                primary_home_interests=self.primary_home_interests,
+                gifts=self.gifts)
 
         limit = min(
             0.03 * max(0, self.agi - self.params.limit_threshold),
             tentative_deduction * 0.8,
         )
-        logging.debug(f"limit = {limit:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'limit', limit, agi=self.agi, limit_threshold=self.params.limit_threshold)
 
         return tentative_deduction - limit
 
@@ -149,7 +143,9 @@ class RegularTaxComputer(FederalTaxComputer):
         taxrate = 0.009
 
         tax = taxrate * max(0, self.medicare_wages - threshold_on_w2)
-        logging.debug(f"applying {taxrate} to {self.medicare_wages:.0f}-{threshold_on_w2}: {tax:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'additional_medicare_tax', tax,
+                taxrate=taxrate, medicare_wages=self.medicare_wages, threshold=threshold_on_w2)
         return tax
 
 
@@ -165,26 +161,36 @@ class RegularTaxComputer(FederalTaxComputer):
             + self.k1_income
             + self.capital_gain
             + self.investment_income_modification)
-        logging.debug(f"investment_income: {investment_income:.0f}")
-        logging.debug(f"    interests: {self.interests:.0f}")
-        logging.debug(f"    dividends: {self.dividends:.0f}")
-        logging.debug(f"    rental_income: {self.rental_income_offset:.0f}")
-        logging.debug(f"    k1_income: {self.k1_income:.0f}")
-        logging.debug(f"    capital_gain: {self.capital_gain:.0f}")
-        logging.debug(f"    investment_income_modification: {self.investment_income_modification:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'investment_income', investment_income,
+                interests=self.interests,
+                dividends=self.dividends,
+                rental_income=self.rental_income_offset,
+                k1_income=self.k1_income,
+                capital_gain=self.capital_gain,
+                investment_income_modification=self.investment_income_modification)
 
         ratio = round(investment_income / self.agi, 4)
         allocable_state_local_income_taxes = self.state_local_income_taxes * ratio
-        logging.debug(f"allocable_state_local_income_taxes: {allocable_state_local_income_taxes:.0f}")
+        limited = False
         if self.year >= 2018:
             if allocable_state_local_income_taxes > 10000:
                 allocable_state_local_income_taxes = 10000
-                logging.debug("    BUT LIMITED TO 10000!")
+                limited = True
+        if tracer.enabled:
+            tracer.record(self, 'allocable_state_local_income_taxes', allocable_state_local_income_taxes,
+                state_local_income_taxes=self.state_local_income_taxes,
+                ratio=ratio,
+                limited=limited)
 
         taxable_investment = investment_income - allocable_state_local_income_taxes
-        logging.debug(f"taxable_investment: {taxable_investment:.0f}")
         tax = taxrate * min(taxable_investment, max(0, self.agi - threshold_on_agi))
-        logging.debug(f"applying {taxrate} to min({taxable_investment:.0f}, {self.agi:.0f}-{threshold_on_agi}): {tax:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'net_investment_income_tax', tax,
+                taxrate=taxrate,
+                taxable_investment=taxable_investment,
+                agi=self.agi,
+                threshold=threshold_on_agi)
         return tax
 
 
@@ -219,7 +225,9 @@ class AMTTaxComputer(FederalTaxComputer):
     @cached_property
     def exemption(self):
         excess = max(0, self.taxable_income - self.params.limit_threshold)
-        logging.debug(f"excess = {excess}")
+        if tracer.enabled:
+            tracer.record(self, 'excess', excess,
+                taxable_income=self.taxable_income, limit_threshold=self.params.limit_threshold)
         return max(0, self.params.exemption - excess * 0.25)
 
 
@@ -229,9 +237,10 @@ class AMTTaxComputer(FederalTaxComputer):
             self.primary_home_interests
             + self.gifts)
 
-        logging.debug(f"itemized_deduction = {itemized_deduction:.0f}")
-        logging.debug(f"    primary_home_interests = {self.primary_home_interests:.0f}")
-        logging.debug(f"    gifts = {self.gifts:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'itemized_deduction', itemized_deduction,
+                primary_home_interests=self.primary_home_interests,
+                gifts=self.gifts)
 
         return itemized_deduction
 
@@ -0,0 +1,177 @@
+from collections import deque
+
+from functools import cached_property
+
+import itertools
+import os
+
+from aggregator import aggregate_household
+from defs import TaxResult
+from federal_tax_computer import RegularTaxComputer, AMTTaxComputer
+from state_tax_computer import StateTaxComputer
+from tax_tables import load, years
+
+
+COMPUTERS = (RegularTaxComputer, AMTTaxComputer, StateTaxComputer)
+
+
+class HouseholdTaxComputer:
+    """Regular, AMT and state tax of one household, aggregating its forms
+    once for all three computers and computing capital_gain,
+    rental_income_offset and agi once, in the regular computer, for all
+    of them.
+
+    computers replaces the classes of the three, e.g. by instrumented ones.
+    """
+
+    SHARED = ('capital_gain', 'rental_income_offset', 'agi')
+
+    def __init__(self, household, computers=COMPUTERS):
+        self.totals = aggregate_household(**household)
+        self.computers = computers
+
+
+    @classmethod
+    def from_totals(cls, totals, computers=COMPUTERS):
+        self = cls.__new__(cls)
+        self.totals = totals
+        self.computers = computers
+        return self
+
+
+    @cached_property
+    def regular(self):
+        return self.computers[0].from_totals(self.totals)
+
+
+    @cached_property
+    def amt(self):
+        return self._sharing(self.computers[1])
+
+
+    @cached_property
+    def state(self):
+        return self._sharing(self.computers[2])
+
+
+    @cached_property
+    def result(self):
+        return tax_result(self.regular, self.amt, self.state)
+
+
+    def _sharing(self, computer):
+        tc = computer.from_totals(self.totals)
+        tc.__dict__.update((name, getattr(self.regular, name)) for name in self.SHARED)
+        return tc
+
+
+def compute_household(household):
+    """TaxResult for one household given as TaxComputer keyword arguments."""
+    return HouseholdTaxComputer(household).result
+
+
+def tax_result(rtc, atc, stc):
+    """TaxResult of the regular, AMT and state computers of a household."""
+    return TaxResult(
+        year=rtc.year,
+        agi=rtc.agi,
+        regular_tax=rtc.tax,
+        amt_tax=atc.tax,
+        amt=max(0, atc.tax - rtc.tax),
+        additional_medicare_tax=rtc.additional_medicare_tax,
+        net_investment_income_tax=rtc.net_investment_income_tax,
+        credits=rtc.credits,
+        federal_tax_withheld=rtc.tax_withheld,
+        penalty=rtc.penalty,
+        federal_tax_due=(
+            max(rtc.tax, atc.tax)
+            + rtc.additional_medicare_tax
+            + rtc.net_investment_income_tax
+            - rtc.credits
+            - rtc.tax_withheld
+            + rtc.penalty),
+        ca_adjusted_agi=stc.ca_adjusted_agi,
+        state_tax=stc.tax,
+        mental_health_services_tax=stc.mental_health_services_tax,
+        state_tax_withheld=stc.tax_withheld,
+        state_tax_due=(
+            stc.tax
+            + stc.mental_health_services_tax
+            - stc.tax_withheld),
+    )
+
+
+def compute_many(households, workers=None, chunksize=64, ordered=True, return_exceptions=False):
+    """Compute TaxResults for an iterable of households.
+
+    Households are sent to a pool of `workers` processes (all CPUs by default)
+    in chunks of `chunksize`, and only a few chunks per worker are in flight
+    at a time, so `households` may be an arbitrarily long generator. With
+    `ordered` the results are yielded in input order; otherwise
+    (index, result) pairs are yielded as chunks complete. `workers=1`
+    computes in this process. With `return_exceptions` the exception a
+    household raises is yielded in place of its result, and the others are
+    still computed.
+    """
+    chunks = _chunks(enumerate(households), chunksize)
+
+    if workers == 1:
+        for chunk in chunks:
+            for index, result in _compute_chunk(chunk, return_exceptions):
+                yield result if ordered else (index, result)
+        return
+
+    # Imported here, as it is slow to import and compute_household does
+    # not need it.
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    workers = workers or os.cpu_count()
+    executor = ProcessPoolExecutor(workers, initializer=warm_tables)
+    pending = deque()
+    try:
+        pending.extend(
+            executor.submit(_compute_chunk, chunk, return_exceptions)
+            for chunk in itertools.islice(chunks, 2 * workers))
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(executor.submit(_compute_chunk, chunk, return_exceptions))
+                for index, result in future.result():
+                    yield result if ordered else (index, result)
+    finally:
+        # shutdown(cancel_futures=True) needs Python 3.9.
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _chunks(iterable, size):
+    while True:
+        chunk = list(itertools.islice(iterable, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _compute_chunk(chunk, return_exceptions=False):
+    if not return_exceptions:
+        return [(index, compute_household(household)) for index, household in chunk]
+    results = []
+    for index, household in chunk:
+        try:
+            results.append((index, compute_household(household)))
+        except Exception as e:
+            results.append((index, e))
+    return results
+
+
+def warm_tables():
+    """Load the tables of every year, e.g. in a new worker process."""
+    for year in years():
+        load(year)
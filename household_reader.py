@@ -0,0 +1,183 @@
+"""Streaming readers of households from CSV and JSON Lines.
+
+Every row of a CSV file, and every line of a JSON Lines file, is one record
+with a `household` id and a `record` type:
+
+    household  the scalar keyword arguments of TaxComputer.__init__
+               (year, capital_loss_carryover, gifts, ...)
+    w2         a FormW2
+    1099       a Form1099
+    real_estate  a RealEstate
+    k1         a FormK1
+
+The remaining columns or keys are the fields of that record; empty or
+missing ones take their defaults. The records of a household must be
+contiguous, and only one household is held in memory at a time.
+
+A JSON line may instead hold a whole household, with the forms as lists of
+objects under form_w2s, form_1099s, real_estates and form_k1s. Its
+rental_loss_carryovers, an object of rental id to loss carryover, make
+real_estates a RentalPortfolio with those carryovers.
+"""
+import csv
+import itertools
+import json
+
+from aggregator import _is_portfolio
+from defs import FormW2, Form1099, RealEstate, FormK1
+
+
+FORMS = {
+    'w2': ('form_w2s', FormW2),
+    '1099': ('form_1099s', Form1099),
+    'real_estate': ('real_estates', RealEstate),
+    'k1': ('form_k1s', FormK1),
+}
+
+
+def read_households(file, format=None, on_error=None):
+    """Yield (household id, TaxComputer keyword arguments) from file.
+
+    file is a path or an open text file; format is 'csv' or 'jsonl' and
+    defaults to the path's extension. See read_household_lines for
+    on_error.
+    """
+    for _, household_id, household in read_household_lines(file, format, on_error):
+        yield household_id, household
+
+
+def read_household_lines(file, format=None, on_error=None):
+    """Yield (line, household id, TaxComputer keyword arguments) from file,
+    line being that of the household's first record.
+
+    A record that cannot be read raises ValueError, or, if on_error is
+    given, is passed to on_error(line, household id, exception) and its
+    household is skipped: the rest of its records are read past.
+    """
+    if format is None:
+        format = 'csv' if str(getattr(file, 'name', file)).endswith('.csv') else 'jsonl'
+    if isinstance(file, str):
+        with open(file, newline='') as f:
+            yield from read_household_lines(f, format, on_error)
+        return
+
+    records = _records(file, format, on_error)
+    for household_id, group in itertools.groupby(records, key=lambda r: r[1].get('household')):
+        household = None
+        for line, record in group:
+            try:
+                if 'record' not in record:
+                    if household is not None:
+                        yield first_line, household_id, household
+                    household = household_from_json(record)
+                    first_line = line
+                    continue
+                if household is None:
+                    household = _empty_household()
+                    first_line = line
+                _add_record(household, record)
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                if on_error is None:
+                    raise
+                on_error(line, household_id, e)
+                household = None
+                break
+        if household is not None:
+            yield first_line, household_id, household
+
+
+def _records(file, format, on_error):
+    """(line, record) of every record of file."""
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+            if not isinstance(record, dict):
+                raise ValueError(f"expected a JSON object, not {type(record).__name__}")
+        except ValueError as e:
+            if on_error is None:
+                raise
+            on_error(line, None, e)
+            continue
+        yield line, record
+
+
+def household_from_json(obj):
+    """TaxComputer keyword arguments from a whole household as JSON."""
+    household = _empty_household()
+    rental_carryovers = None
+    for key, value in obj.items():
+        if key == 'household':
+            continue
+        if key == 'rental_loss_carryovers':
+            rental_carryovers = {str(k): float(v) for k, v in value.items()}
+        elif key in household:
+            form_type = next(t for name, t in FORMS.values() if name == key)
+            household[key] = [_form(form_type, fields) for fields in value]
+        else:
+            household[key] = _scalar(key, value)
+    if rental_carryovers is not None:
+        from rental_portfolio import RentalPortfolio
+        household['real_estates'] = RentalPortfolio(household['real_estates'], rental_carryovers)
+    return household
+
+
+def household_to_json(household):
+    """JSON-serializable form of TaxComputer keyword arguments, as read
+    back by household_from_json. A RentalPortfolio is written as its
+    real_estates and rental_loss_carryovers."""
+    obj = {}
+    for name, value in household.items():
+        if value is None:
+            continue
+        if name == 'real_estates' and _is_portfolio(value):
+            obj['rental_loss_carryovers'] = dict(value.carryovers)
+            value = list(value)
+        obj[name] = [form._asdict() for form in value] if isinstance(value, list) else value
+    return obj
+
+
+def _empty_household():
+    return {name: [] for name, _ in FORMS.values()}
+
+
+def _add_record(household, record):
+    kind = record['record']
+    fields = {
+        k: v for k, v in record.items()
+        if k not in ('household', 'record') and v not in ('', None)}
+    if kind == 'household':
+        household.update((k, _scalar(k, v)) for k, v in fields.items())
+    elif kind in FORMS:
+        name, form_type = FORMS[kind]
+        household[name].append(_form(form_type, fields))
+    else:
+        raise ValueError(f"unknown record type {kind!r}")
+
+
+def _form(form_type, fields):
+    values = {}
+    for key, value in fields.items():
+        if key not in form_type._fields:
+            raise ValueError(f"{form_type.__name__} has no field {key!r}")
+        if value in ('', None):
+            continue
+        if key == 'id':
+            values[key] = str(value)
+        elif key == 'is_primary':
+            values[key] = value if isinstance(value, bool) else value.lower() in ('1', 'true', 'yes')
+        else:
+            values[key] = float(value)
+    return form_type(**values)
+
+
+def _scalar(key, value):
+    if key == 'year':
+        return int(float(value))
+    return float(value)
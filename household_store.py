@@ -0,0 +1,148 @@
+"""On-disk columnar store of aggregated household inputs.
+
+A store is a directory with one raw little-endian array per field of
+defs.fields_aggregate (`<field>.bin`, int64 for year, float64 otherwise)
+and a `header.json` recording the number of households, written last, so
+a store whose writing failed has none and cannot be opened. Columns are read
+back with np.memmap, so opening a store costs nothing regardless of its
+size, the batch engine reads the mapped pages without copying, and any
+number of processes can map the same store at once.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import json
+import os
+
+import numpy as np
+
+from aggregator import aggregate_household
+from batch_tax_computer import compute_batch
+from defs import fields_aggregate
+
+
+VERSION = 1
+
+DTYPES = {name: np.dtype('<f8') for name in fields_aggregate}
+DTYPES['year'] = np.dtype('<i8')
+
+
+class HouseholdStoreWriter:
+    """Appends aggregated households to a new store, a chunk at a time.
+    Used as a context manager, the store is left without a header if the
+    block raises."""
+
+    def __init__(self, path, chunksize=65536):
+        self.path = path
+        self.chunksize = chunksize
+        self.size = 0
+        self.chunk = {name: [] for name in fields_aggregate}
+        os.makedirs(path, exist_ok=True)
+        # The columns of an earlier store at path are overwritten.
+        header = os.path.join(path, 'header.json')
+        if os.path.exists(header):
+            os.unlink(header)
+        self.files = {
+            name: open(os.path.join(path, f"{name}.bin"), 'wb')
+            for name in fields_aggregate}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+    def append(self, totals):
+        """Add one household given as its aggregated inputs."""
+        for name, column in self.chunk.items():
+            column.append(totals[name])
+        if len(self.chunk['year']) >= self.chunksize:
+            self.flush()
+
+
+    def flush(self):
+        for name, column in self.chunk.items():
+            np.asarray(column, dtype=DTYPES[name]).tofile(self.files[name])
+            column.clear()
+        self.size = self.files['year'].tell() // DTYPES['year'].itemsize
+
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        with open(os.path.join(self.path, 'header.json'), 'w') as f:
+            json.dump({
+                'version': VERSION,
+                'size': self.size,
+                'columns': {name: DTYPES[name].str for name in fields_aggregate},
+            }, f)
+
+
+    def abort(self):
+        """Close the columns without writing the header."""
+        for f in self.files.values():
+            f.close()
+
+
+def write_store(path, households, chunksize=65536):
+    """Aggregate households, given as TaxComputer keyword arguments, into a
+    new store at path in one streaming pass. Returns the number written."""
+    with HouseholdStoreWriter(path, chunksize) as writer:
+        for household in households:
+            writer.append(aggregate_household(**household))
+    return writer.size
+
+
+def open_store(path, start=0, stop=None):
+    """Memory-mapped columns of households [start, stop) of the store."""
+    with open(os.path.join(path, 'header.json')) as f:
+        header = json.load(f)
+    if header['version'] != VERSION:
+        raise ValueError(f"unsupported household store version {header['version']}")
+
+    size = header['size']
+    stop = size if stop is None else min(stop, size)
+    start = min(start, stop)
+    columns = {}
+    for name, dtype in header['columns'].items():
+        dtype = np.dtype(dtype)
+        if start == stop:
+            columns[name] = np.empty(0, dtype)
+            continue
+        columns[name] = np.memmap(
+            os.path.join(path, f"{name}.bin"),
+            dtype=dtype,
+            mode='r',
+            offset=start * dtype.itemsize,
+            shape=(stop - start,))
+    return columns
+
+
+def store_size(path):
+    with open(os.path.join(path, 'header.json')) as f:
+        return json.load(f)['size']
+
+
+def compute_store(path, workers=None, chunksize=262144):
+    """compute_batch over a whole store, split into ranges of `chunksize`
+    households that worker processes map and compute independently."""
+    size = store_size(path)
+    ranges = [(path, start, start + chunksize) for start in range(0, size, chunksize)]
+    if workers == 1 or len(ranges) <= 1:
+        results = [_compute_range(*r) for r in ranges] or [compute_batch(open_store(path))]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_compute_range, *zip(*ranges)))
+    return {
+        name: np.concatenate([result[name] for result in results])
+        for name in results[0]}
+
+
+def _compute_range(path, start, stop):
+    return compute_batch(open_store(path, start, stop))
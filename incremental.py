@@ -0,0 +1,80 @@
+from functools import cached_property
+
+from federal_tax_computer import RegularTaxComputer, AMTTaxComputer
+from state_tax_computer import StateTaxComputer
+
+
+class IncrementalMixin:
+    """Invalidate only the affected cached properties when an input changes.
+
+    Every derived attribute of the computers, agi, capital_gain and
+    rental_income_offset included, is a cached property. While one is
+    being evaluated every attribute it reads is recorded as one of its
+    dependencies, whether that is an input or another cached property:
+    capital_gain depends on long_term_capital_gain among others, and agi
+    on capital_gain. Assigning an input drops the cached values that
+    depend on it, and transitively their dependents, so setting
+    long_term_capital_gain recomputes capital_gain, agi and what reads
+    them on the next read, while params or the withholding totals are
+    kept.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._derived = frozenset(
+            name for klass in cls.__mro__ for name, value in vars(klass).items()
+            if isinstance(value, cached_property))
+
+
+    def __init__(self, *args, **kwargs):
+        object.__setattr__(self, '_evaluating', [])
+        object.__setattr__(self, '_dependents', {})
+        super().__init__(*args, **kwargs)
+
+
+    def __getattribute__(self, name):
+        get = object.__getattribute__
+        if name[0] == '_':
+            return get(self, name)
+        evaluating = get(self, '_evaluating')
+        if evaluating:
+            get(self, '_dependents').setdefault(name, set()).add(evaluating[-1])
+        if name in get(self, '_derived') and name not in get(self, '__dict__'):
+            evaluating.append(name)
+            try:
+                return get(self, name)
+            finally:
+                evaluating.pop()
+        return get(self, name)
+
+
+    def __setattr__(self, name, value):
+        if name in self._derived:
+            raise AttributeError(f"{name} is derived and cannot be set")
+        object.__setattr__(self, name, value)
+        self._invalidate(name)
+
+
+    def update(self, **inputs):
+        """Set several inputs at once."""
+        for name, value in inputs.items():
+            setattr(self, name, value)
+
+
+    def _invalidate(self, name):
+        cache = self.__dict__
+        for dependent in self._dependents.pop(name, ()):
+            cache.pop(dependent, None)
+            self._invalidate(dependent)
+
+
+class IncrementalRegularTaxComputer(IncrementalMixin, RegularTaxComputer):
+    pass
+
+
+class IncrementalAMTTaxComputer(IncrementalMixin, AMTTaxComputer):
+    pass
+
+
+class IncrementalStateTaxComputer(IncrementalMixin, StateTaxComputer):
+    pass
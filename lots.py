@@ -0,0 +1,320 @@
+"""Capital gains of lot-level 1099-B trades, with wash sales detected.
+
+    engine = LotEngine(year=2020)
+    for trade in read_trades('trades.csv'):
+        engine.add(trade)
+    household['form_1099s'].append(engine.form_1099('Brokerage'))
+
+Trades are Purchases of shares and Sales of lots, fed in order of trade
+date. A sale is long term when its shares were held more than one year,
+short term otherwise. A 1099-B lists only the sales; the purchases, of
+shares sold or still held, come from the brokerage's trade history.
+
+A sale at a loss is a wash sale when shares of the same security are
+bought within 30 days before or after it: the loss on as many shares as
+were bought is disallowed, and is added instead to the basis of the
+replacement shares, whose holding period then includes that of the shares
+sold. Replacement shares are taken in the order they were bought, and each
+replaces shares of one loss only. The shares of a lot are taken from the
+purchase of its acquisition date, replacement shares first; the losses of
+a sale of one term are washed together, carrying the shortest holding
+period among them.
+
+Each security keeps the purchases and the losses of the last 30 days in
+lists sorted by date, looked up by bisection, so a trade takes about
+constant time and only those windows, and the replacement shares not yet
+sold, are held in memory, whatever the length of the history.
+"""
+from bisect import bisect_left
+from collections import deque, namedtuple
+from datetime import date, timedelta
+from operator import attrgetter
+
+import argparse
+import csv
+import json
+
+from defs import Form1099
+
+
+WINDOW = timedelta(days=30)
+
+Purchase = namedtuple('Purchase', ['security', 'date', 'quantity'])
+
+Sale = namedtuple('Sale', [
+    'security',
+    'date',             # sold
+    'acquired',
+    'quantity',
+    'proceeds',
+    'cost_basis',
+])
+
+
+def is_long_term(acquired, sold):
+    """Whether shares acquired and sold on these dates were held more than
+    one year."""
+    if acquired.month == 2 and acquired.day == 29:
+        acquired = acquired.replace(day=28)
+    return sold > acquired.replace(year=acquired.year + 1)
+
+
+class _Window:
+    """Items added in order of date, dropped once exhausted or out of the
+    window."""
+
+    def __init__(self, remaining):
+        self.remaining = remaining
+        self.dates = []
+        self.items = []
+        self.start = 0
+
+
+    def append(self, day, item):
+        self.dates.append(day)
+        self.items.append(item)
+
+
+    def find(self, day):
+        i = bisect_left(self.dates, day, self.start)
+        if i < len(self.dates) and self.dates[i] == day:
+            return self.items[i]
+        return None
+
+
+    def since(self, day):
+        """The items from day on, in order, after dropping earlier ones."""
+        start = bisect_left(self.dates, day, self.start)
+        while start < len(self.items) and self.remaining(self.items[start]) <= 0:
+            start += 1
+        if start > len(self.items) // 2:
+            del self.dates[:start], self.items[:start]
+            start = 0
+        self.start = start
+        return self.items[start:]
+
+
+class _Purchase:
+
+    __slots__ = ('date', 'free', 'parcels')
+
+    def __init__(self, day, quantity):
+        self.date = day
+        self.free = quantity        # shares held that replace no loss
+        self.parcels = deque()      # [shares, basis added per share, days held added]
+
+
+class _Loss:
+
+    __slots__ = ('date', 'quantity', 'loss', 'is_long', 'days')
+
+    def __init__(self, day, quantity, loss, is_long, days):
+        self.date = day
+        self.quantity = quantity    # shares not replaced yet
+        self.loss = loss            # per share
+        self.is_long = is_long
+        self.days = days            # held
+
+
+class _Security:
+
+    def __init__(self):
+        self.purchases = _Window(attrgetter('free'))
+        self.losses = _Window(attrgetter('quantity'))
+
+
+class LotEngine:
+    """Short and long term capital gains of a stream of trades, of the
+    sales of `year`, or of every sale when year is None."""
+
+    def __init__(self, year=None):
+        self.year = year
+        self.date = date.min
+        self.short_term_capital_gain = 0
+        self.long_term_capital_gain = 0
+        self.wash_sale_loss_disallowed = 0
+        self._securities = {}
+        self._replacements = {}     # (security, date): _Purchase with parcels
+
+
+    def add(self, trade):
+        if isinstance(trade, Purchase):
+            self.buy(trade)
+        else:
+            self.sell(trade)
+
+
+    def buy(self, purchase):
+        security = self._security(purchase.security, purchase.date)
+        in_window = security.purchases.find(purchase.date)
+        bought = self._replacements.get((purchase.security, purchase.date)) or in_window
+        if bought is None:
+            bought = _Purchase(purchase.date, 0)
+        if bought is not in_window:
+            security.purchases.append(purchase.date, bought)
+        bought.free += purchase.quantity
+        for loss in security.losses.since(purchase.date - WINDOW):
+            if bought.free <= 0:
+                break
+            shares = min(loss.quantity, bought.free)
+            loss.quantity -= shares
+            self._replace(purchase.security, bought, shares, loss)
+
+
+    def sell(self, sale):
+        if sale.quantity <= 0:
+            raise ValueError(f"{sale.security} sold {sale.date}: quantity {sale.quantity!r} is not positive")
+        if sale.acquired > sale.date:
+            raise ValueError(f"{sale.security} sold {sale.date}: acquired later, {sale.acquired}")
+        security = self._security(sale.security, sale.date)
+        key = (sale.security, sale.acquired)
+        bought = self._replacements.get(key) or security.purchases.find(sale.acquired)
+        gain = sale.proceeds - sale.cost_basis
+        losses = {}
+        for shares, basis, days in self._take(key, bought, sale.quantity):
+            days += (sale.date - sale.acquired).days
+            is_long = is_long_term(sale.date - timedelta(days=days), sale.date)
+            shares_gain = gain * shares / sale.quantity - basis * shares
+            self._count(sale.date, is_long, shares_gain)
+            if shares_gain < 0:
+                # Losses of a term are washed together, or replacement
+                # shares would split further with every sale.
+                loss = losses.get(is_long)
+                if loss is None:
+                    losses[is_long] = _Loss(sale.date, shares, -shares_gain, is_long, days)
+                else:
+                    loss.quantity += shares
+                    loss.loss -= shares_gain
+                    loss.days = min(loss.days, days)
+        for loss in losses.values():
+            loss.loss /= loss.quantity
+            self._wash(security, sale, loss)
+
+
+    def _security(self, name, day):
+        if day < self.date:
+            raise ValueError(f"{name} traded {day}: trades are not in date order, after {self.date}")
+        self.date = day
+        security = self._securities.get(name)
+        if security is None:
+            security = self._securities[name] = _Security()
+        return security
+
+
+    def _take(self, key, bought, quantity):
+        """[(shares, basis added per share, days held added)] of quantity
+        shares sold from bought, replacement shares first."""
+        taken = []
+        if bought is not None:
+            parcels = bought.parcels
+            while parcels and quantity > 0:
+                parcel = parcels[0]
+                shares = min(quantity, parcel[0])
+                taken.append((shares, parcel[1], parcel[2]))
+                quantity -= shares
+                parcel[0] -= shares
+                if parcel[0] <= 0:
+                    parcels.popleft()
+            if not parcels:
+                self._replacements.pop(key, None)
+            bought.free = max(0, bought.free - quantity)
+        if quantity > 0:
+            taken.append((quantity, 0, 0))
+        return taken
+
+
+    def _wash(self, security, sale, loss):
+        for bought in security.purchases.since(sale.date - WINDOW):
+            if bought.free <= 0:
+                continue
+            shares = min(loss.quantity, bought.free)
+            loss.quantity -= shares
+            self._replace(sale.security, bought, shares, loss)
+            if loss.quantity <= 0:
+                return
+        security.losses.append(sale.date, loss)
+
+
+    def _replace(self, name, bought, shares, loss):
+        """Disallow the loss on shares, moving it to shares of bought."""
+        bought.free -= shares
+        bought.parcels.append([shares, loss.loss, loss.days])
+        self._replacements[(name, bought.date)] = bought
+        self._count(loss.date, loss.is_long, shares * loss.loss)
+        if self.year is None or loss.date.year == self.year:
+            self.wash_sale_loss_disallowed += shares * loss.loss
+
+
+    def _count(self, sold, is_long, gain):
+        if self.year is None or sold.year == self.year:
+            if is_long:
+                self.long_term_capital_gain += gain
+            else:
+                self.short_term_capital_gain += gain
+
+
+    def form_1099(self, id=''):
+        """Form1099 of the capital gains."""
+        return Form1099(
+            id=id,
+            short_term_capital_gain=self.short_term_capital_gain,
+            long_term_capital_gain=self.long_term_capital_gain)
+
+
+def read_trades(file, format=None):
+    """Yield the Purchases and Sales of file, in its order.
+
+    file is a path or an open text file; format is 'csv' or 'jsonl' and
+    defaults to the path's extension. Every row or line is a trade with a
+    `record` type, 'buy' with the fields of a Purchase or 'sell' with
+    those of a Sale; dates are ISO dates.
+    """
+    if format is None:
+        format = 'csv' if str(getattr(file, 'name', file)).endswith('.csv') else 'jsonl'
+    if isinstance(file, str):
+        with open(file, newline='') as f:
+            yield from read_trades(f, format)
+        return
+
+    if format == 'csv':
+        records = csv.DictReader(file)
+    else:
+        records = (json.loads(line) for line in file if line.strip())
+    for record in records:
+        kind = record.get('record')
+        if kind == 'buy':
+            yield Purchase(record['security'], _date(record['date']), float(record['quantity']))
+        elif kind == 'sell':
+            yield Sale(
+                record['security'],
+                _date(record['date']),
+                _date(record['acquired']),
+                float(record['quantity']),
+                float(record['proceeds']),
+                float(record['cost_basis']))
+        else:
+            raise ValueError(f"unknown record type {kind!r}")
+
+
+def _date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('trades', help='CSV or JSON Lines file of trades in date order')
+    parser.add_argument('-y', '--year', type=int, help='count only the sales of year')
+    parser.add_argument('--id', default='', help='id of the Form1099')
+    args = parser.parse_args()
+
+    engine = LotEngine(args.year)
+    for trade in read_trades(args.trades):
+        engine.add(trade)
+    print(json.dumps({
+        **engine.form_1099(args.id)._asdict(),
+        'wash_sale_loss_disallowed': engine.wash_sale_loss_disallowed,
+    }))
+
+
+if __name__ == '__main__':
+    main()
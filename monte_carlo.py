@@ -0,0 +1,118 @@
+"""Monte Carlo simulation of a household with uncertain inputs.
+
+    summary = simulate(household, {
+        ('w2', 'medicare_wages', 'state_wages'): Normal(250000, 40000),
+        'long_term_capital_gain': Empirical(past_gains),
+    }, draws=1000000)
+    summary.percentiles['federal_tax_due'][90]
+
+Distributions are keyed by the aggregated input they replace, one of
+defs.fields_aggregate, or by a tuple of inputs that all take the same draw.
+Every other input keeps the household's value. Draws are computed by the
+batch engine in batches, spread over worker processes; each batch draws
+from its own child of one SeedSequence, so the results depend on the seed
+but not on the number of workers.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import os
+
+import numpy as np
+
+from aggregator import aggregate_household
+from batch_tax_computer import compute_batch
+from defs import fields_aggregate
+
+
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+Summary = namedtuple('Summary', [
+    'draws',
+    'mean',             # {field: mean}
+    'percentiles',      # {field: {percentile: value}}
+    'amt_probability',
+])
+
+FIELDS = ('federal_tax_due', 'state_tax_due')
+
+
+class Normal:
+
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+
+    def sample(self, rng, size):
+        return rng.normal(self.mean, self.std, size)
+
+
+class LogNormal:
+    """Log-normal with the given median and standard deviation of the log."""
+
+    def __init__(self, median, sigma):
+        self.median = median
+        self.sigma = sigma
+
+
+    def sample(self, rng, size):
+        return rng.lognormal(np.log(self.median), self.sigma, size)
+
+
+class Empirical:
+    """Resampling, with replacement, of observed values."""
+
+    def __init__(self, samples):
+        self.samples = np.asarray(samples, dtype=np.float64)
+
+
+    def sample(self, rng, size):
+        return rng.choice(self.samples, size)
+
+
+def simulate(household, distributions, draws=100000, seed=0, workers=None, batch=65536):
+    """Summary of federal and state tax due of household, TaxComputer keyword
+    arguments, over `draws` draws of the distributions."""
+    totals = aggregate_household(**household)
+    totals = {name: totals[name] for name in fields_aggregate}
+    distributions = {
+        (names,) if isinstance(names, str) else tuple(names): distribution
+        for names, distribution in distributions.items()}
+    for names in distributions:
+        for name in names:
+            if name not in totals or name == 'year':
+                raise ValueError(f"{name!r} is not an aggregated input")
+
+    sizes = [min(batch, draws - start) for start in range(0, draws, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(totals, distributions, size, seed) for size, seed in zip(sizes, seeds)]
+    if workers == 1 or len(tasks) <= 1:
+        results = [_simulate_batch(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(min(workers or os.cpu_count(), len(tasks))) as executor:
+            results = list(executor.map(_simulate_batch, *zip(*tasks)))
+
+    columns = {field: np.concatenate([r[field] for r in results]) for field in FIELDS}
+    return Summary(
+        draws=draws,
+        mean={field: column.mean().item() for field, column in columns.items()},
+        percentiles={
+            field: dict(zip(PERCENTILES, np.percentile(column, PERCENTILES).tolist()))
+            for field, column in columns.items()},
+        amt_probability=sum(r['amt'] for r in results) / draws)
+
+
+def _simulate_batch(totals, distributions, size, seed):
+    rng = np.random.default_rng(seed)
+    columns = {name: np.full(size, total) for name, total in totals.items()}
+    for names, distribution in distributions.items():
+        values = distribution.sample(rng, size)
+        for name in names:
+            columns[name] = values
+    results = compute_batch(columns)
+    return {
+        'federal_tax_due': results['federal_tax_due'],
+        'state_tax_due': results['state_tax_due'],
+        'amt': int(np.count_nonzero(results['amt'] > 0)),
+    }
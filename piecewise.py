@@ -0,0 +1,291 @@
+"""Piecewise-linear tax curves, with breakpoints from the tax tables.
+
+Regular tax, AMT and CA tax are piecewise linear in any one input, with
+steps at the `math.ceil(excess / 2500)` exemption phase-outs. They bend
+or step only where an amount the computers derive from the input crosses
+a value from the tables that it is compared with: a bracket boundary or
+QDCG threshold, a phase-out's limit_threshold and each multiple of 2500
+above it, the point where the AMT exemption runs out, the standard
+deduction, the SALT cap or the capital loss limit.
+
+So the computers are evaluated with a Line as the input, a value with
+its slope that every operation carries along like sensitivity.Dual.
+Each comparison the computers make records how far the input can move
+before its two sides cross, and each ceil() how far to its next step.
+One evaluation gives the tax along a whole segment, up to the nearest of
+those breakpoints, where the next evaluation starts. Evaluations are
+bounded by `max_evaluations`; when they run out, the rest of the range
+is taken as one chord and the Curve is not `complete`. A Curve reports
+the evaluations it took.
+
+    curves = tax_curves(params, 'long_term_capital_gain', 0, 200000)
+    for segment in curves['amt']:
+        ...
+    curves['amt'].evaluations
+"""
+from collections import namedtuple
+
+import math
+
+from aggregator import aggregate_household
+from defs import fields_aggregate
+from federal_tax_computer import RegularTaxComputer, AMTTaxComputer
+from state_tax_computer import StateTaxComputer
+
+
+# The curve on [start, end] is value + slope * (x - start).
+Segment = namedtuple('Segment', ['start', 'end', 'value', 'slope'])
+
+# Values closer than this, relative to the magnitudes they were computed
+# from, are taken to be equal, as in sensitivity.TOLERANCE.
+TOLERANCE = 1e-12
+
+MAX_EVALUATIONS = 10000
+
+COMPUTERS = {
+    'regular': RegularTaxComputer,
+    'amt': AMTTaxComputer,
+    'state': StateTaxComputer,
+}
+
+
+class Curve(list):
+    """Segments of a curve, in order, with the evaluations of the function
+    that found them and whether they were found within max_evaluations."""
+
+    def __init__(self, segments=(), evaluations=0, complete=True):
+        super().__init__(segments)
+        self.evaluations = evaluations
+        self.complete = complete
+
+
+class Line:
+    """A value with its slope with respect to the input, at one point.
+
+    Comparisons are made on the values; where two values tie, the slopes
+    break the tie, so that every branch is the one taken just right of
+    the point. Each comparison appends to `breaks`, a list shared by the
+    Lines of one evaluation, how far the input can grow before the two
+    sides cross. Values tie when they are within TOLERANCE of `scale`,
+    the largest magnitude met in computing either.
+    """
+
+    __slots__ = ('value', 'slope', 'breaks', 'scale')
+
+    def __init__(self, value, slope, breaks=None, scale=None):
+        self.value = value
+        self.slope = slope
+        self.breaks = breaks
+        self.scale = abs(value) if scale is None else scale
+
+
+    def __add__(self, other):
+        if isinstance(other, Line):
+            return Line(
+                self.value + other.value, self.slope + other.slope, self.breaks,
+                max(self.scale, other.scale))
+        return Line(self.value + other, self.slope, self.breaks, max(self.scale, abs(other)))
+
+    __radd__ = __add__
+
+
+    def __sub__(self, other):
+        if isinstance(other, Line):
+            return Line(
+                self.value - other.value, self.slope - other.slope, self.breaks,
+                max(self.scale, other.scale))
+        return Line(self.value - other, self.slope, self.breaks, max(self.scale, abs(other)))
+
+
+    def __rsub__(self, other):
+        return Line(other - self.value, -self.slope, self.breaks, max(self.scale, abs(other)))
+
+
+    def __mul__(self, other):
+        if isinstance(other, Line):
+            if self.slope and other.slope:
+                raise TypeError("a product of two Lines is not linear")
+            return Line(
+                self.value * other.value,
+                self.slope * other.value + other.slope * self.value,
+                self.breaks,
+                self.scale * other.scale)
+        return Line(self.value * other, self.slope * other, self.breaks, self.scale * abs(other))
+
+    __rmul__ = __mul__
+
+
+    def __truediv__(self, other):
+        if isinstance(other, Line):
+            if other.slope:
+                raise TypeError("a quotient by a sloped Line is not linear")
+            other = other.value
+        return Line(self.value / other, self.slope / other, self.breaks, self.scale / abs(other))
+
+
+    def __neg__(self):
+        return Line(-self.value, -self.slope, self.breaks, self.scale)
+
+
+    def __pos__(self):
+        return self
+
+
+    def __abs__(self):
+        return -self if self < 0 else self
+
+
+    def __ceil__(self):
+        integer = round(self.value)
+        if abs(self.value - integer) > TOLERANCE * max(1, self.scale):
+            integer = math.ceil(self.value)
+        elif self.slope > 0:
+            integer += 1
+        if self.slope > 0:
+            self._break((integer - self.value) / self.slope)
+        elif self.slope < 0:
+            self._break((integer - 1 - self.value) / self.slope)
+        return integer
+
+
+    def __float__(self):
+        return float(self.value)
+
+
+    def _break(self, distance):
+        if self.breaks is not None:
+            self.breaks.append(distance)
+
+
+    def _compare(self, other):
+        if isinstance(other, Line):
+            value, slope, scale = other.value, other.slope, other.scale
+        else:
+            value, slope, scale = other, 0, abs(other)
+        difference, direction = self.value - value, self.slope - slope
+        if abs(difference) > TOLERANCE * max(self.scale, scale):
+            if difference * direction < 0:
+                self._break(-difference / direction)
+            return -1 if difference < 0 else 1
+        return (direction > 0) - (direction < 0)
+
+
+    def __lt__(self, other):
+        return self._compare(other) < 0
+
+
+    def __le__(self, other):
+        return self._compare(other) <= 0
+
+
+    def __gt__(self, other):
+        return self._compare(other) > 0
+
+
+    def __ge__(self, other):
+        return self._compare(other) >= 0
+
+
+    def __eq__(self, other):
+        return self._compare(other) == 0
+
+
+    def __ne__(self, other):
+        return self._compare(other) != 0
+
+    __hash__ = None
+
+
+    def __format__(self, format_spec):
+        return format(self.value, format_spec)
+
+
+    def __repr__(self):
+        return f"Line({self.value!r}, {self.slope!r})"
+
+
+def tax_curves(params, input_name, start, stop, max_evaluations=MAX_EVALUATIONS):
+    """Curve of each computer's tax as input_name, one of the aggregated
+    inputs such as long_term_capital_gain or w2, goes from start to stop."""
+    if input_name not in fields_aggregate or input_name == 'year':
+        raise ValueError(f"{input_name!r} is not an aggregated input")
+    totals = aggregate_household(**params)
+    curves = {}
+    for name, computer in COMPUTERS.items():
+
+        def tax(x, computer=computer):
+            return computer.from_totals({**totals, input_name: x}).tax
+
+        curves[name] = segments(tax, start, stop, max_evaluations)
+    return curves
+
+
+def segments(f, start, stop, max_evaluations=MAX_EVALUATIONS):
+    """Curve of the piecewise-linear segments of f over [start, stop].
+
+    f is called with a Line at the start of each segment and must compute
+    with the operations a Line has; it is evaluated max_evaluations times
+    at most.
+    """
+    evaluations = 0
+
+    def line(x):
+        nonlocal evaluations
+        evaluations += 1
+        breaks = []
+        y = f(Line(x, 1.0, breaks))
+        if isinstance(y, Line):
+            return y.value, y.slope, breaks
+        return y, 0.0, breaks
+
+    if stop <= start:
+        value, _, _ = line(start)
+        return Curve([Segment(start, start, value, 0.0)], evaluations)
+
+    result = []
+    x = start
+    while x < stop:
+        value, slope, breaks = line(x)
+        end = min([stop] + [x + distance for distance in breaks if x + distance > x])
+        _append(result, Segment(x, end, value, slope))
+        if end < stop and evaluations + 1 >= max_evaluations:
+            # Out of evaluations; the rest is one chord to the value at stop.
+            value += slope * (end - x)
+            end_value, _, _ = line(stop)
+            _append(result, Segment(end, stop, value, (end_value - value) / (stop - end)))
+            return Curve(result, evaluations, False)
+        x = end
+    return Curve(result, evaluations)
+
+
+def evaluate(segments, x):
+    """The curve at x, taking the right-hand value at a step."""
+    for segment in segments:
+        if x < segment.end:
+            break
+    return segment.value + segment.slope * (x - segment.start)
+
+
+def vertices(segments):
+    """x and y coordinates that draw the curve, steps included."""
+    xs, ys = [], []
+    for segment in segments:
+        xs += [segment.start, segment.end]
+        ys += [segment.value, segment.value + segment.slope * (segment.end - segment.start)]
+    return xs, ys
+
+
+def _append(result, segment):
+    """Append segment, merging it into the previous one when it continues
+    the same line."""
+    if result:
+        last = result[-1]
+        if (_close(last.slope, segment.slope)
+                and _close(last.value + last.slope * (segment.start - last.start), segment.value)):
+            result[-1] = last._replace(end=segment.end)
+            return
+    result.append(segment)
+
+
+def _close(x, y, tolerance=1e-9):
+    return abs(x - y) <= tolerance * max(1, abs(x), abs(y))
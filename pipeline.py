@@ -0,0 +1,126 @@
+"""Compute consecutive tax years, carrying each year's results into the next.
+
+Three inputs of a year follow from the year before:
+
+    capital_loss_carryover   the net capital loss beyond the $3000 allowed
+    rental_loss_carryover    the rental loss not offset by rental income
+    state_tax_adjustments_for_previous_return
+                             the state tax due (positive) or refunded
+                             (negative) on the previous return
+
+CarryoverPipeline takes them from the household of the first year and
+computes them for every later one. Where a year's real_estates is a
+RentalPortfolio, the rental loss carryover lives in the portfolio: it is
+carried into a copy of that year's portfolio, per rental, rather than into
+rental_loss_carryover. Years are memoized on the household
+together with its incoming carryovers, so after editing one year only that
+year and, as far as their carryovers change, the following ones are
+computed again.
+"""
+from collections import namedtuple
+
+from household import HouseholdTaxComputer
+from rental_portfolio import RentalPortfolio
+from tax_computer import TaxComputer
+
+
+CARRYOVERS = (
+    'capital_loss_carryover',
+    'rental_loss_carryover',
+    'state_tax_adjustments_for_previous_return',
+)
+
+Carryovers = namedtuple('Carryovers', CARRYOVERS)
+
+# The household as computed, carryovers included, its TaxResult and the
+# carryovers into the next year; rental_carryovers are those per rental id
+# when the household's real_estates is a RentalPortfolio, else None.
+YearResult = namedtuple('YearResult', ['household', 'result', 'carryovers', 'rental_carryovers'])
+
+
+class CarryoverPipeline:
+
+    def __init__(self):
+        self.memo = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def run(self, households):
+        """YearResults of households, TaxComputer keyword arguments of
+        consecutive years in order."""
+        results = []
+        year = None
+        for household in households:
+            if year is not None:
+                household = carry_into(household, year)
+            year = self.compute(household)
+            results.append(year)
+        return results
+
+
+    def compute(self, household):
+        key = freeze(household)
+        year = self.memo.get(key)
+        if year is not None:
+            self.hits += 1
+            return year
+        self.misses += 1
+
+        computer = HouseholdTaxComputer(household)
+        result = computer.result
+        real_estates = household.get('real_estates')
+        rental_carryovers = None
+        if isinstance(real_estates, RentalPortfolio):
+            rental_carryovers = real_estates.next_carryovers()
+        year = self.memo[key] = YearResult(
+            household, result, next_carryovers(computer.regular, result), rental_carryovers)
+        return year
+
+
+    def clear(self):
+        self.memo.clear()
+
+
+def next_carryovers(rtc, result):
+    """Carryovers into the year after the one computed by rtc."""
+    net_capital_gain = rtc.short_term_capital_gain + rtc.long_term_capital_gain - rtc.capital_loss_carryover
+    return Carryovers(
+        capital_loss_carryover=max(0, TaxComputer.CAPITAL_LOSS_LIMIT - net_capital_gain),
+        rental_loss_carryover=max(0, rtc.rental_loss_carryover - rtc.rental_income),
+        state_tax_adjustments_for_previous_return=result.state_tax_due)
+
+
+def carry_into(household, previous):
+    """household with the carryovers of the YearResult of the year before."""
+    household = {**household, **previous.carryovers._asdict()}
+    real_estates = household.get('real_estates')
+    if not isinstance(real_estates, RentalPortfolio):
+        return household
+    rental_carryovers = previous.rental_carryovers
+    if rental_carryovers is None:
+        if previous.carryovers.rental_loss_carryover:
+            raise ValueError(
+                f"the rental loss carryover into {household['year']} cannot be "
+                "allocated to the rentals of its RentalPortfolio")
+        rental_carryovers = {}
+    household['real_estates'] = real_estates.copy(rental_carryovers)
+    household['rental_loss_carryover'] = 0
+    return household
+
+
+def freeze(household):
+    """Hashable form of TaxComputer keyword arguments. A RentalPortfolio is
+    frozen by its contents, so changes to it are seen."""
+    return tuple(sorted(
+        (name, _freeze_value(value))
+        for name, value in household.items()
+        if value is not None))
+
+
+def _freeze_value(value):
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, RentalPortfolio):
+        return value.contents()
+    return value
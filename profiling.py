@@ -0,0 +1,130 @@
+"""Opt-in instrumentation of TaxComputer subclasses.
+
+    profiler = Profiler()
+    Computer = profiler.instrument(RegularTaxComputer)
+    Computer(**params).tax
+    print(profiler.format_table())
+
+An instrumented class counts, per attribute, how often each property is
+evaluated and how often a cached property is served from its cache, and
+measures cumulative time and self time (cumulative time less the time
+spent evaluating other instrumented attributes). Public methods such as
+compute_tax_with_qdcg are timed the same way.
+"""
+from dataclasses import dataclass, asdict
+from functools import cached_property
+
+import inspect
+import json
+import time
+
+
+@dataclass
+class AttributeStats:
+    evaluations: int = 0
+    hits: int = 0
+    cumulative: float = 0.0
+    self: float = 0.0
+
+
+class Profiler:
+
+    def __init__(self):
+        self.stats = {}
+        self._children = []
+
+
+    def instrument(self, cls):
+        """Subclass of cls whose properties and public methods are profiled."""
+        namespace = {'__module__': cls.__module__, '__qualname__': cls.__qualname__}
+        for name, value in _attributes(cls):
+            key = f"{cls.__name__}.{name}"
+            if isinstance(value, cached_property):
+                namespace[name] = self._cached_property(key, name, value.func)
+            elif isinstance(value, property) and value.fget is not None:
+                namespace[name] = property(self._timed(key, value.fget))
+            elif inspect.isfunction(value):
+                namespace[name] = self._timed(key, value)
+        return type(cls.__name__, (cls,), namespace)
+
+
+    def reset(self):
+        self.stats = {}
+
+
+    def as_dict(self):
+        return {key: asdict(stats) for key, stats in self.stats.items()}
+
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+
+    def format_table(self):
+        rows = sorted(self.stats.items(), key=lambda item: -item[1].cumulative)
+        width = max([len(key) for key, _ in rows] + [len('attribute')])
+        lines = [f"{'attribute':{width}} {'evals':>7} {'hits':>7} {'cum ms':>9} {'self ms':>9}"]
+        for key, s in rows:
+            lines.append(
+                f"{key:{width}} {s.evaluations:7d} {s.hits:7d}"
+                f" {s.cumulative * 1e3:9.3f} {s.self * 1e3:9.3f}")
+        return '\n'.join(lines)
+
+
+    def _stats(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = AttributeStats()
+        return stats
+
+
+    def _timed(self, key, func):
+        profiler = self
+
+        def timed(*args, **kwargs):
+            stats = profiler._stats(key)
+            profiler._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = profiler._children.pop()
+                stats.evaluations += 1
+                stats.cumulative += elapsed
+                stats.self += elapsed - children
+                if profiler._children:
+                    profiler._children[-1] += elapsed
+
+        timed.__name__ = func.__name__
+        timed.__doc__ = func.__doc__
+        return timed
+
+
+    def _cached_property(self, key, name, func):
+        evaluate = self._timed(key, func)
+        profiler = self
+
+        def get(instance):
+            cache = instance.__dict__
+            if name in cache:
+                profiler._stats(key).hits += 1
+                return cache[name]
+            value = cache[name] = evaluate(instance)
+            return value
+
+        return property(get)
+
+
+def _attributes(cls):
+    """Public attributes of cls and its bases, nearest definition first."""
+    seen = set()
+    for klass in cls.__mro__:
+        if klass is object:
+            continue
+        for name, value in vars(klass).items():
+            if name.startswith('_') or name in seen:
+                continue
+            seen.add(name)
+            yield name, value
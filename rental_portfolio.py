@@ -0,0 +1,179 @@
+"""Real estate of a household indexed by property id, with running totals.
+
+    portfolio = RentalPortfolio(household['real_estates'])
+    portfolio.update(RealEstate(id='Rental 3', rents=24000, taxes=3100))
+    portfolio.remove('Rental 7')
+    household['real_estates'] = portfolio
+
+Adding, updating or removing a property adjusts the totals the computers
+read, primary home taxes and interests and rental income, in constant
+time, and aggregate_forms takes them from the portfolio instead of summing
+every property again. Totals are kept as exact fractions, so after any
+sequence of changes they are the correctly rounded sum of the current
+properties, as math.fsum would give, rather than an accumulation of
+rounding errors; they can differ from summing a list of the same
+properties in order in the last bit.
+
+Each rental carries its own loss carryover, the losses suspended in
+earlier years. With a portfolio, this is where the household's rental loss
+carryover lives: its rental_loss_carryover is their total, and
+aggregate_household refuses a rental_loss_carryover passed besides.
+"""
+from fractions import Fraction
+from operator import attrgetter
+
+from aggregator import RENTAL_EXPENSES
+
+
+TOTALS = (
+    'primary_home_taxes',
+    'primary_home_interests',
+    'rental_income',
+    'rental_loss_carryover',
+)
+
+_expenses = attrgetter(*RENTAL_EXPENSES)
+
+
+class RentalPortfolio:
+
+    def __init__(self, real_estates=(), carryovers=None):
+        self.properties = {}
+        self.incomes = {}           # rental id: rents less expenses
+        self.carryovers = {}        # rental id: loss carryover
+        self._totals = dict.fromkeys(TOTALS, Fraction(0))
+        for real_estate in real_estates:
+            self.add(real_estate)
+        for property_id, carryover in (carryovers or {}).items():
+            self.set_carryover(property_id, carryover)
+
+
+    def __len__(self):
+        return len(self.properties)
+
+
+    def __iter__(self):
+        return iter(self.properties.values())
+
+
+    def __contains__(self, property_id):
+        return property_id in self.properties
+
+
+    def __getitem__(self, property_id):
+        return self.properties[property_id]
+
+
+    def copy(self, carryovers=None):
+        """A portfolio of the same properties, with carryovers if given
+        and otherwise the same carryovers. Carryovers of rentals no longer
+        in the portfolio leave with them, as on remove."""
+        if carryovers is None:
+            carryovers = self.carryovers
+        return RentalPortfolio(self, {
+            property_id: carryover for property_id, carryover in carryovers.items()
+            if property_id in self.incomes})
+
+
+    def contents(self):
+        """Hashable value of the properties and carryovers, equal for
+        portfolios that compute the same."""
+        return (tuple(self.properties.values()), tuple(sorted(self.carryovers.items())))
+
+
+    def add(self, real_estate):
+        if real_estate.id in self.properties:
+            raise KeyError(f"{real_estate.id!r} is already in the portfolio")
+        self.properties[real_estate.id] = real_estate
+        self._count(real_estate, 1)
+
+
+    def update(self, real_estate):
+        """Replace the property of the same id; its carryover is kept."""
+        old = self.properties[real_estate.id]
+        if old.is_primary != real_estate.is_primary:
+            raise ValueError(f"{real_estate.id!r} cannot change between primary and rental")
+        self._count(old, -1)
+        self.properties[real_estate.id] = real_estate
+        self._count(real_estate, 1)
+
+
+    def remove(self, property_id):
+        """Remove a property, and its carryover with it."""
+        self._count(self.properties.pop(property_id), -1)
+        self.set_carryover(property_id, 0)
+        self.incomes.pop(property_id, None)
+
+
+    def set_carryover(self, property_id, carryover):
+        if property_id not in self.incomes:
+            if not carryover:
+                return
+            raise KeyError(f"{property_id!r} is not a rental in the portfolio")
+        self._totals['rental_loss_carryover'] += (
+            Fraction(carryover) - Fraction(self.carryovers.get(property_id, 0)))
+        if carryover:
+            self.carryovers[property_id] = carryover
+        else:
+            self.carryovers.pop(property_id, None)
+
+
+    def _count(self, real_estate, sign):
+        totals = self._totals
+        if real_estate.is_primary:
+            totals['primary_home_taxes'] += sign * Fraction(real_estate.taxes)
+            totals['primary_home_interests'] += sign * Fraction(real_estate.interests)
+            return
+        income = real_estate.rents - sum(_expenses(real_estate))
+        totals['rental_income'] += sign * Fraction(income)
+        if sign > 0:
+            self.incomes[real_estate.id] = income
+
+
+    def totals(self):
+        """{name: total} of TOTALS, as the aggregated inputs of the same
+        names."""
+        return {name: _number(total) for name, total in self._totals.items()}
+
+
+    @property
+    def rental_income(self):
+        return _number(self._totals['rental_income'])
+
+
+    @property
+    def rental_loss_carryover(self):
+        return _number(self._totals['rental_loss_carryover'])
+
+
+    def next_carryovers(self):
+        """{rental id: loss carryover} into the next year.
+
+        Their total is what the computers leave unused, the carryover less
+        the rental income when positive (see pipeline.next_carryovers); it
+        is allocated to the rentals in proportion to their own carryover
+        less their income, when positive.
+        """
+        unused = self._totals['rental_loss_carryover'] - self._totals['rental_income']
+        losses = {
+            property_id: loss for property_id, loss in (
+                (property_id, Fraction(self.carryovers.get(property_id, 0)) - Fraction(income))
+                for property_id, income in self.incomes.items())
+            if loss > 0}
+        if unused <= 0 or not losses:
+            return {}
+        total = sum(losses.values())
+        return {property_id: _number(unused * loss / total) for property_id, loss in losses.items()}
+
+
+    def carry_over(self):
+        """Replace the carryovers with those into the next year."""
+        carryovers = self.next_carryovers()
+        for property_id in list(self.carryovers):
+            self.set_carryover(property_id, 0)
+        for property_id, carryover in carryovers.items():
+            self.set_carryover(property_id, carryover)
+
+
+def _number(total):
+    return total.numerator if total.denominator == 1 else float(total)
@@ -0,0 +1,159 @@
+"""On-disk cache of TaxResults, keyed by content.
+
+    cache = ResultCache('.tax_cache')
+    result = cache.compute(household)
+    cache.stats()
+
+The key of a household is the sha256 of its aggregated inputs (year
+included) and of the table version, a hash of the tax tables and of the
+computers' source, so any edit to them invalidates every entry; entries of
+other versions are dropped when a cache is opened. Results are kept in
+SQLite, and the least recently used are evicted beyond `max_entries`.
+"""
+from collections import deque
+
+import hashlib
+import os
+import sqlite3
+import statistics
+import struct
+import threading
+import time
+
+from aggregator import aggregate_household
+from defs import TaxResult, fields_aggregate, fields_result
+from household import HouseholdTaxComputer
+from tax_tables import data_files
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Everything a result depends on once the inputs are aggregated, with the
+# data files of tax_tables.
+SOURCES = (
+    'defs.py',
+    'household.py',
+    'tax_tables.py',
+    'tax_brackets.py',
+    'tax_computer.py',
+    'federal_tax_computer.py',
+    'state_tax_computer.py',
+)
+
+
+def table_version():
+    digest = hashlib.sha256()
+    for source in SOURCES + tuple(os.path.relpath(path, ROOT) for path in data_files()):
+        with open(os.path.join(ROOT, source), 'rb') as f:
+            digest.update(source.encode() + b'\0' + f.read() + b'\0')
+    return digest.hexdigest()
+
+
+INPUTS = struct.Struct(f"<q{len(fields_aggregate) - 1}d")
+RESULT = struct.Struct(f"<q{len(fields_result) - 1}d")
+
+
+def cache_key(totals, version):
+    """sha256 of aggregated inputs, as returned by aggregate_household,
+    and the table version."""
+    return hashlib.sha256(version.encode() + INPUTS.pack(*(
+        totals[name] for name in fields_aggregate))).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, directory, max_entries=1000000, version=None):
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.version = version or table_version()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.latencies = deque(maxlen=10000)
+        # Recency of hits, written to the database in batches.
+        self.touched = {}
+
+        self.db = sqlite3.connect(
+            os.path.join(directory, 'results.sqlite'), check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' key TEXT PRIMARY KEY, version TEXT, result BLOB, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+        self.db.execute('DELETE FROM results WHERE version != ?', (self.version,))
+        self.db.commit()
+        self.entries = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+    def compute(self, household):
+        """TaxResult of a household given as TaxComputer keyword arguments,
+        from the cache or computed and stored."""
+        totals = aggregate_household(**household)
+        key = cache_key(totals, self.version)
+        result = self.get(key)
+        if result is None:
+            result = HouseholdTaxComputer.from_totals(totals).result
+            self.put(key, result)
+        return result
+
+
+    def get(self, key):
+        start = time.perf_counter()
+        with self.lock:
+            row = self.db.execute('SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.touched[key] = time.time()
+                if len(self.touched) >= 1024:
+                    self._flush()
+            self.latencies.append(time.perf_counter() - start)
+        return None if row is None else TaxResult._make(RESULT.unpack(row[0]))
+
+
+    def put(self, key, result):
+        with self.lock:
+            inserted = self.db.execute(
+                'INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)',
+                (key, self.version, RESULT.pack(*result), time.time())).rowcount
+            self.entries += inserted
+            if self.entries > self.max_entries:
+                self._flush()
+                self.db.execute(
+                    'DELETE FROM results WHERE key IN'
+                    ' (SELECT key FROM results ORDER BY used LIMIT ?)',
+                    (self.entries - self.max_entries,))
+                self.entries = self.max_entries
+            self.db.commit()
+
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': self.entries,
+            }
+            if len(self.latencies) >= 2:
+                quantiles = statistics.quantiles(self.latencies, n=100, method='inclusive')
+                stats['lookup_us'] = {f"p{p}": quantiles[p - 1] * 1e6 for p in (50, 90, 99)}
+            return stats
+
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.db.commit()
+        self.db.close()
+
+
+    def _flush(self):
+        self.db.executemany(
+            'UPDATE results SET used = ? WHERE key = ?',
+            [(used, key) for key, used in self.touched.items()])
+        self.db.commit()
+        self.touched.clear()
@@ -0,0 +1,79 @@
+"""Split a Roth conversion across years to minimize federal plus CA tax.
+
+    plan = optimize_conversions([household_2019, household_2020], 150000)
+    plan.amounts    # conversion per year, in the order given
+
+Every household is evaluated with every conversion amount on a grid of
+`step` dollars in one compute_batch call, giving the tax of each year as a
+function of its conversion. Years are then combined one at a time by a
+min-plus convolution: the cheapest way to convert j steps over the years
+so far is the cheapest of converting k steps this year and j - k before.
+"""
+from collections import namedtuple
+
+import math
+
+import numpy as np
+
+from batch_tax_computer import columns_from_households, compute_batch
+
+
+# amounts and taxes are per year; taxes are federal plus state tax due.
+RothPlan = namedtuple('RothPlan', ['amounts', 'taxes', 'tax', 'baseline_tax'])
+
+
+def optimize_conversions(households, total, step=1000):
+    """RothPlan converting `total` dollars in multiples of `step` across
+    households, TaxComputer keyword arguments of one year each, whose own
+    roth_conversion_gain is kept as it is. total must be a multiple of
+    step."""
+    if not households:
+        raise ValueError("no households to convert in")
+    if step <= 0 or total < 0:
+        raise ValueError(f"cannot convert {total} in steps of {step}")
+    steps = int(round(total / step))
+    if not math.isclose(steps * step, total):
+        raise ValueError(f"total {total} is not a multiple of step {step}")
+    costs = conversion_costs(households, np.arange(steps + 1) * step)
+
+    # best[j] is the least tax converting j steps over the years so far, and
+    # choices[y][j] the number of steps converted in year y to get there.
+    best = costs[0]
+    choices = []
+    for cost in costs[1:]:
+        combined = np.full(steps + 1, np.inf)
+        choice = np.zeros(steps + 1, dtype=np.int64)
+        for k in range(steps + 1):
+            candidates = best[:steps + 1 - k] + cost[k]
+            better = candidates < combined[k:]
+            combined[k:][better] = candidates[better]
+            choice[k:][better] = k
+        best = combined
+        choices.append(choice)
+
+    counts = []
+    remaining = steps
+    for choice in reversed(choices):
+        counts.append(choice[remaining].item())
+        remaining -= counts[-1]
+    counts.append(remaining)
+    counts.reverse()
+
+    amounts = [count * step for count in counts]
+    taxes = [cost[count].item() for cost, count in zip(costs, counts)]
+    return RothPlan(
+        amounts=amounts,
+        taxes=taxes,
+        tax=sum(taxes),
+        baseline_tax=costs[:, 0].sum().item())
+
+
+def conversion_costs(households, amounts):
+    """Federal plus state tax due of each household for each extra
+    conversion amount, as an array of shape (households, amounts)."""
+    columns = columns_from_households(households)
+    n, m = len(households), len(amounts)
+    grid = {name: np.repeat(column, m) for name, column in columns.items()}
+    grid['roth_conversion_gain'] = grid['roth_conversion_gain'] + np.tile(amounts, n)
+    results = compute_batch(grid)
+    return (results['federal_tax_due'] + results['state_tax_due']).reshape(n, m)
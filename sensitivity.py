@@ -0,0 +1,462 @@
+"""Marginal rates of tax with respect to every aggregated input.
+
+For one household the computers are evaluated once with dual numbers as
+inputs: each input carries, besides its value, its derivative with respect
+to every input, and every operation of the computers carries the
+derivatives along. This gives the exact rates of the next dollar of every
+result in the same pass; steps such as the ceil() exemption phase-outs
+have zero derivative.
+
+    marginal_rates(household)['long_term_capital_gain']
+
+For a population the batch engine is evaluated once with DualArrays as
+inputs, columns that carry a gradient row per input the same way, so
+the rates of every household come out of one pass too.
+"""
+import math
+
+import numpy as np
+
+from aggregator import aggregate_household
+from batch_tax_computer import (
+    BatchTaxComputer,
+    BatchRegularTaxComputer,
+    BatchAMTTaxComputer,
+    BatchStateTaxComputer,
+    compute_batch,
+)
+from defs import fields_aggregate
+from household import HouseholdTaxComputer
+
+
+INPUTS = tuple(name for name in fields_aggregate if name != 'year')
+
+# Values closer than this, relative to the magnitudes they were computed
+# from, are taken to be equal; float rounding alone, as in a sum of W-2
+# withholdings against the rate times their wages, leaves them apart.
+TOLERANCE = 1e-12
+
+
+class Dual:
+    """A value with its gradient with respect to the inputs.
+
+    Comparisons are made on the values. Where two values tie, as in
+    max(0, rental_income) with no rentals, the branch taken depends on
+    which input grows, so the indices of the inputs involved are added to
+    `ties`, a set shared by the Duals of one evaluation, and the tie is
+    broken by the direction in which every input grows. Values tie when
+    they are within TOLERANCE of `scale`, the largest magnitude met in
+    computing either, so that rounding errors do not pick the branch.
+    """
+
+    __slots__ = ('value', 'gradient', 'ties', 'scale')
+
+    def __init__(self, value, gradient, ties=None, scale=None):
+        self.value = value
+        self.gradient = gradient
+        self.ties = ties
+        self.scale = abs(value) if scale is None else scale
+
+
+    @classmethod
+    def variable(cls, value, index, size=len(INPUTS), ties=None):
+        gradient = np.zeros(size)
+        gradient[index] = 1
+        return cls(value, gradient, ties)
+
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(
+                self.value + other.value, self.gradient + other.gradient, self.ties,
+                max(self.scale, other.scale))
+        return Dual(self.value + other, self.gradient, self.ties, max(self.scale, abs(other)))
+
+    __radd__ = __add__
+
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(
+                self.value - other.value, self.gradient - other.gradient, self.ties,
+                max(self.scale, other.scale))
+        return Dual(self.value - other, self.gradient, self.ties, max(self.scale, abs(other)))
+
+
+    def __rsub__(self, other):
+        return Dual(other - self.value, -self.gradient, self.ties, max(self.scale, abs(other)))
+
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            return Dual(
+                self.value * other.value,
+                self.gradient * other.value + other.gradient * self.value,
+                self.ties,
+                self.scale * other.scale)
+        return Dual(self.value * other, self.gradient * other, self.ties, self.scale * abs(other))
+
+    __rmul__ = __mul__
+
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            return Dual(
+                self.value / other.value,
+                (self.gradient * other.value - other.gradient * self.value) / other.value ** 2,
+                self.ties,
+                self.scale / abs(other.value))
+        return Dual(self.value / other, self.gradient / other, self.ties, self.scale / abs(other))
+
+
+    def __rtruediv__(self, other):
+        return Dual(other / self.value, self.gradient * (-other / self.value ** 2), self.ties)
+
+
+    def __neg__(self):
+        return Dual(-self.value, -self.gradient, self.ties, self.scale)
+
+
+    def __pos__(self):
+        return self
+
+
+    def __abs__(self):
+        return -self if self < 0 else self
+
+
+    def __round__(self, ndigits=None):
+        if ndigits is None:
+            return round(self.value)
+        return Dual(round(self.value, ndigits), np.zeros_like(self.gradient), self.ties)
+
+
+    def __ceil__(self):
+        return math.ceil(self.value)
+
+
+    def __floor__(self):
+        return math.floor(self.value)
+
+
+    def __float__(self):
+        return float(self.value)
+
+
+    def _compare(self, other):
+        if isinstance(other, Dual):
+            value, gradient, scale = other.value, other.gradient, other.scale
+        else:
+            value, gradient, scale = other, 0, abs(other)
+        if abs(self.value - value) > TOLERANCE * max(self.scale, scale):
+            return -1 if self.value < value else 1
+        direction = self.gradient - gradient
+        if self.ties is not None:
+            self.ties.update(np.flatnonzero(direction).tolist())
+        total = direction.sum().item()
+        return (total > 0) - (total < 0)
+
+
+    def __lt__(self, other):
+        return self._compare(other) < 0
+
+
+    def __le__(self, other):
+        return self._compare(other) <= 0
+
+
+    def __gt__(self, other):
+        return self._compare(other) > 0
+
+
+    def __ge__(self, other):
+        return self._compare(other) >= 0
+
+
+    def __eq__(self, other):
+        return self._compare(other) == 0
+
+
+    def __ne__(self, other):
+        return self._compare(other) != 0
+
+    __hash__ = None
+
+
+    def __format__(self, format_spec):
+        return format(self.value, format_spec)
+
+
+    def __repr__(self):
+        return f"Dual({self.value!r}, {self.gradient!r})"
+
+
+def sensitivities(household, inputs=INPUTS, ties=None):
+    """TaxResult of a household given as TaxComputer keyword arguments,
+    with every field a Dual whose gradient is indexed like inputs."""
+    totals = aggregate_household(**household)
+    for index, name in enumerate(inputs):
+        totals[name] = Dual.variable(totals[name], index, len(inputs), ties)
+    return HouseholdTaxComputer.from_totals(totals).result
+
+
+def marginal_rates(household, field=None):
+    """{input: marginal rate} of the household's total federal and state tax
+    due, or of the given TaxResult field.
+
+    Inputs that took part in a tie are evaluated again on their own, so
+    that the tie is broken in the direction of that input alone.
+    """
+    ties = set()
+    rates = dict(zip(INPUTS, _gradient(sensitivities(household, ties=ties), field).tolist()))
+    for index in sorted(ties):
+        name = INPUTS[index]
+        rates[name] = _gradient(sensitivities(household, (name,)), field, 1)[0].item()
+    return rates
+
+
+def batch_marginal_rates(columns, field=None, inputs=INPUTS):
+    """{input: array of marginal rates} over the households in columns, of
+    total tax due or of the given result field, from one compute_batch call
+    over DualArray inputs."""
+    size = len(columns['year'])
+    columns = dict(columns)
+    for index, name in enumerate(inputs):
+        columns[name] = DualArray.variable(
+            BatchTaxComputer.column(columns.get(name, 0), size), index, len(inputs))
+
+    results = compute_batch(columns, DUAL_COMPUTERS)
+    if field is None:
+        total = results['federal_tax_due'] + results['state_tax_due']
+    else:
+        total = results[field]
+    if not isinstance(total, DualArray):
+        return {name: np.zeros(size) for name in inputs}
+    return dict(zip(inputs, total.gradient))
+
+
+class DualArray(np.lib.mixins.NDArrayOperatorsMixin):
+    """Columns of values with their gradients, for the batch engine.
+
+    `gradient` has a row per input and a column per household. numpy's
+    ufuncs and np.where carry the gradients along as Dual's operations
+    do. A tie is broken for each input in the direction in which that
+    input grows, so comparing DualArrays gives a DualMask with a branch
+    per input, from which np.where takes each input's derivative; the
+    values are compared as they are, so that they stay those of the
+    batch engine.
+    """
+
+    __slots__ = ('value', 'gradient', 'scale')
+
+    def __init__(self, value, gradient, scale=None):
+        self.value = value
+        self.gradient = gradient
+        self.scale = np.abs(value) if scale is None else scale
+
+
+    @classmethod
+    def variable(cls, values, index, size=len(INPUTS)):
+        gradient = np.zeros((size, len(values)))
+        gradient[index] = 1
+        return cls(np.array(values, dtype=np.float64), gradient)
+
+
+    def __getitem__(self, index):
+        return DualArray(self.value[index], self.gradient[:, index], self.scale[index])
+
+
+    def __setitem__(self, index, other):
+        value, gradient, scale = _dual_parts(other)
+        self.value[index] = value
+        self.gradient[:, index] = gradient
+        self.scale[index] = scale
+
+
+    def __len__(self):
+        return len(self.value)
+
+
+    def __float__(self):
+        return float(self.value)
+
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs or ufunc not in _DUAL_UFUNCS:
+            return NotImplemented
+        return _DUAL_UFUNCS[ufunc](*(_dual_parts(x) for x in inputs))
+
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func not in _DUAL_FUNCTIONS:
+            return NotImplemented
+        return _DUAL_FUNCTIONS[func](*args, **kwargs)
+
+
+    def __repr__(self):
+        return f"DualArray({self.value!r}, {self.gradient!r})"
+
+
+class DualMask(np.lib.mixins.NDArrayOperatorsMixin):
+    """The outcome of comparing DualArrays: `value` for the values, and
+    `gradient` with the branch for each input, a row per input."""
+
+    __slots__ = ('value', 'gradient')
+
+    def __init__(self, value, gradient):
+        self.value = value
+        self.gradient = gradient
+
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs or ufunc not in _MASK_UFUNCS:
+            return NotImplemented
+        return DualMask(
+            ufunc(*(x.value if isinstance(x, DualMask) else x for x in inputs)),
+            ufunc(*(x.gradient if isinstance(x, DualMask) else x for x in inputs)))
+
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func is not np.flatnonzero:
+            return NotImplemented
+        return np.flatnonzero(args[0].value)
+
+
+class DualMixin:
+    """Batch computers over DualArray inputs; brackets give each input
+    the rate of the bracket it moves into."""
+
+    @staticmethod
+    def column(values, size):
+        if isinstance(values, DualArray):
+            return values
+        return BatchTaxComputer.column(values, size)
+
+
+    @staticmethod
+    def _apply_tax_brackets(brackets, amount):
+        if not isinstance(amount, DualArray):
+            return BatchTaxComputer._apply_tax_brackets(brackets, amount)
+        boundaries = np.array(brackets.boundaries, dtype=np.float64)
+        taxrates = np.array(brackets.taxrates)
+        i = np.searchsorted(boundaries, amount.value, side='left') - 1
+        j = np.maximum(i, 0)
+        tax = BatchTaxComputer._apply_tax_brackets(brackets, amount.value)
+        scale = np.where(i < 0, 0, np.maximum(
+            np.array(brackets.cumulative)[j],
+            np.maximum(amount.scale, boundaries[j]) * taxrates[j]))
+
+        def rate(amount):
+            i = np.searchsorted(boundaries, amount, side='left') - 1
+            return np.where(i < 0, 0, taxrates[np.maximum(i, 0)])
+
+        tolerance = TOLERANCE * np.maximum(amount.scale, 1)
+        gradient = np.where(
+            amount.gradient > 0,
+            amount.gradient * rate(amount.value + tolerance),
+            amount.gradient * rate(amount.value - tolerance))
+        return DualArray(tax, gradient, scale)
+
+
+class DualRegularTaxComputer(DualMixin, BatchRegularTaxComputer):
+    pass
+
+
+class DualAMTTaxComputer(DualMixin, BatchAMTTaxComputer):
+    pass
+
+
+class DualStateTaxComputer(DualMixin, BatchStateTaxComputer):
+    pass
+
+
+DUAL_COMPUTERS = (DualRegularTaxComputer, DualAMTTaxComputer, DualStateTaxComputer)
+
+
+def _dual_parts(x):
+    """(value, gradient, scale) of a DualArray or of a constant."""
+    if isinstance(x, DualArray):
+        return x.value, x.gradient, x.scale
+    return x, 0, np.abs(x)
+
+
+def _compare(operator):
+    """Ufunc of a comparison, with ties broken by each input's direction."""
+
+    def compare(a, b):
+        (va, ga, sa), (vb, gb, sb) = a, b
+        tied = np.abs(va - vb) <= TOLERANCE * np.maximum(sa, sb)
+        return DualMask(operator(va, vb), np.where(tied, operator(ga - gb, 0), operator(va, vb)))
+
+    return compare
+
+
+def _select(mask, a, b):
+    (va, ga, sa), (vb, gb, sb) = a, b
+    return DualArray(
+        np.where(mask.value, va, vb), np.where(mask.gradient, ga, gb), np.where(mask.value, sa, sb))
+
+
+def _step(operator):
+    """Ufunc of a step function, whose derivative is zero."""
+
+    def step(a):
+        va, ga, sa = a
+        return DualArray(operator(va), np.zeros_like(ga), sa)
+
+    return step
+
+
+def _where(condition, a, b):
+    if isinstance(condition, DualMask):
+        return _select(condition, _dual_parts(a), _dual_parts(b))
+    return _select(DualMask(condition, condition), _dual_parts(a), _dual_parts(b))
+
+
+def _zeros_like(a, *args, **kwargs):
+    return DualArray(np.zeros_like(a.value), np.zeros_like(a.gradient), np.zeros_like(a.scale))
+
+
+def _round_dual(a, decimals=0):
+    return DualArray(np.round(a.value, decimals), np.zeros_like(a.gradient), a.scale)
+
+
+_DUAL_UFUNCS = {
+    np.add: lambda a, b: DualArray(a[0] + b[0], a[1] + b[1], np.maximum(a[2], b[2])),
+    np.subtract: lambda a, b: DualArray(a[0] - b[0], a[1] - b[1], np.maximum(a[2], b[2])),
+    np.multiply: lambda a, b: DualArray(a[0] * b[0], a[1] * b[0] + b[1] * a[0], a[2] * b[2]),
+    np.true_divide: lambda a, b: DualArray(
+        a[0] / b[0], (a[1] * b[0] - b[1] * a[0]) / b[0] ** 2, a[2] / np.abs(b[0])),
+    np.negative: lambda a: DualArray(-a[0], -a[1], a[2]),
+    np.positive: lambda a: DualArray(a[0], a[1], a[2]),
+    np.absolute: lambda a: _select(_compare(np.less)(a, (0, 0, 0)), (-a[0], -a[1], a[2]), a),
+    np.maximum: lambda a, b: _select(_compare(np.greater)(a, b), a, b),
+    np.minimum: lambda a, b: _select(_compare(np.less)(a, b), a, b),
+    np.ceil: _step(np.ceil),
+    np.floor: _step(np.floor),
+    np.greater: _compare(np.greater),
+    np.greater_equal: _compare(np.greater_equal),
+    np.less: _compare(np.less),
+    np.less_equal: _compare(np.less_equal),
+    np.equal: _compare(np.equal),
+    np.not_equal: _compare(np.not_equal),
+}
+
+_MASK_UFUNCS = {np.bitwise_and, np.bitwise_or, np.invert, np.logical_and, np.logical_or, np.logical_not}
+
+_DUAL_FUNCTIONS = {
+    np.where: _where,
+    np.zeros_like: _zeros_like,
+    np.round: _round_dual,
+    np.around: _round_dual,
+}
+
+
+def _gradient(result, field, size=len(INPUTS)):
+    if field is None:
+        total = result.federal_tax_due + result.state_tax_due
+    else:
+        total = getattr(result, field)
+    if isinstance(total, Dual):
+        return total.gradient
+    return np.zeros(size)
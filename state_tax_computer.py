@@ -1,10 +1,10 @@
 from functools import cached_property
 
-import logging
 import math
 
 from tax_computer import TaxComputer
 from state_tax_table import state_tax_table
+from tracing import tracer
 
 
 class StateTaxComputer(TaxComputer):
@@ -25,7 +25,8 @@ class StateTaxComputer(TaxComputer):
     @cached_property
     def exemption(self):
         excess = max(0, self.agi - self.params.limit_threshold)
-        logging.debug(f"excess = {excess:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'excess', excess, agi=self.agi, limit_threshold=self.params.limit_threshold)
         return max(0, self.params.exemption - math.ceil(excess / 2500) * 6)
 
 
@@ -37,18 +38,20 @@ class StateTaxComputer(TaxComputer):
             self.other_taxes +
             self.primary_home_interests +
             self.gifts)
-        logging.debug(f"tentative_deduction = {tentative_deduction:.0f}")
-        logging.debug(f"    primary_home_taxes = {self.primary_home_taxes:.0f}")
-        logging.debug(f"    car_registration = {self.car_registration:.0f}")
-        logging.debug(f"    other_taxes = {self.other_taxes:.0f}")
-        logging.debug(f"    primary_home_interests = {self.primary_home_interests:.0f}")
-        logging.debug(f"    gifts = {self.gifts:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'tentative_deduction', tentative_deduction,
+                primary_home_taxes=self.primary_home_taxes,
+                car_registration=self.car_registration,
+                other_taxes=self.other_taxes,
+                primary_home_interests=self.primary_home_interests,
+                gifts=self.gifts)
 
         limit = min(
             0.06 * max(0, self.agi - self.params.limit_threshold),
             tentative_deduction * 0.8,
         )
-        logging.debug(f"limit = {limit:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'limit', limit, agi=self.agi, limit_threshold=self.params.limit_threshold)
         return tentative_deduction - limit
 
 
@@ -73,7 +76,9 @@ class StateTaxComputer(TaxComputer):
         taxrate = 0.01
 
         tax = taxrate * max(0, self.taxable_income - threshold)
-        logging.debug(f"applying {taxrate} to {self.taxable_income:.0f}-{threshold}: {tax:.0f}")
+        if tracer.enabled:
+            tracer.record(self, 'mental_health_services_tax', tax,
+                taxrate=taxrate, taxable_income=self.taxable_income, threshold=threshold)
         return tax
 
 
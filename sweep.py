@@ -0,0 +1,87 @@
+"""Tax of a household over a grid of values of its aggregated inputs.
+
+    grid = sweep(household, {
+        'long_term_capital_gain': np.linspace(0, 200000, 200),
+        'roth_conversion_gain': np.linspace(0, 100000, 200),
+    })
+    grid.values['tax_due']      # a (200, 200) array, ready for a heatmap
+
+Each axis replaces one of defs.fields_aggregate with the given values;
+every other input keeps the household's value. The grid is evaluated by
+the batch engine, `batch` points at a time, and comes back as dense
+arrays indexed like numpy.meshgrid(..., indexing='ij'), or as a table of
+rows from rows().
+"""
+from collections import namedtuple
+
+import math
+
+import numpy as np
+
+from aggregator import aggregate_household
+from batch_tax_computer import compute_batch
+from defs import fields_aggregate
+
+
+FIELDS = (
+    'regular_tax',
+    'amt_tax',
+    'amt',
+    'state_tax',
+    'federal_tax_due',
+    'state_tax_due',
+    'tax_due',          # federal and state tax due
+)
+
+Sweep = namedtuple('Sweep', [
+    'axes',             # {input: 1-D array of its values}
+    'values',           # {field: array of shape (len(axis) for axis in axes)}
+])
+
+
+def sweep(household, axes, batch=65536):
+    """Sweep of household, TaxComputer keyword arguments, over the grid of
+    axes, {input: values}."""
+    totals = aggregate_household(**household)
+    axes = {name: np.asarray(values, dtype=np.float64) for name, values in axes.items()}
+    for name, values in axes.items():
+        if name not in fields_aggregate or name == 'year':
+            raise ValueError(f"{name!r} is not an aggregated input")
+        if values.ndim != 1 or not len(values):
+            raise ValueError(f"{name!r} needs a non-empty list of values")
+
+    shape = tuple(len(values) for values in axes.values())
+    size = math.prod(shape)
+    values = {field: np.empty(size) for field in FIELDS}
+    for start in range(0, size, batch):
+        stop = min(size, start + batch)
+        columns = {name: totals[name] for name in fields_aggregate}
+        columns['year'] = np.full(stop - start, totals['year'])
+        for (name, axis), index in zip(axes.items(), np.unravel_index(np.arange(start, stop), shape)):
+            columns[name] = axis[index]
+        results = compute_batch(columns)
+        for field in FIELDS[:-1]:
+            values[field][start:stop] = results[field]
+    values['tax_due'] = values['federal_tax_due'] + values['state_tax_due']
+    return Sweep(axes, {field: column.reshape(shape) for field, column in values.items()})
+
+
+def rows(grid):
+    """The points of a Sweep in order, as tuples of the axis values followed
+    by FIELDS."""
+    columns = [
+        column.ravel() for column in np.meshgrid(*grid.axes.values(), indexing='ij')
+    ] + [grid.values[field].ravel() for field in FIELDS]
+    return zip(*(column.tolist() for column in columns))
+
+
+def parse_axis(text):
+    """(input, values) of 'input=start:stop:count', count values evenly
+    spaced from start to stop, or of 'input=value,value,...'."""
+    name, sep, spec = text.partition('=')
+    if not sep:
+        raise ValueError(f"{text!r} is not input=start:stop:count or input=value,...")
+    if ':' in spec:
+        start, stop, count = spec.split(':')
+        return name, np.linspace(float(start), float(stop), int(count))
+    return name, np.array([float(value) for value in spec.split(',')])
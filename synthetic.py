@@ -0,0 +1,130 @@
+"""Seeded generator of synthetic households for benchmarks and tests.
+
+Households are TaxComputer keyword arguments. Each one follows a profile
+that exercises a particular part of the computation:
+
+    wages    salaried household with a home
+    amt      high state and property taxes and private activity bond
+             interest, so that AMT applies before 2018
+    qdcg     large qualified dividends and long-term capital gains
+    niit     AGI well above the net investment income tax threshold
+    rental   dozens of rental properties
+"""
+import random
+
+from defs import FormW2, Form1099, RealEstate, FormK1
+from federal_tax_table import regular_tax_table
+
+
+PROFILES = ('wages', 'amt', 'qdcg', 'niit', 'rental')
+
+
+def generate_households(n, seed=0, profile=None, years=None):
+    """n synthetic households; profile defaults to a random one each."""
+    rng = random.Random(seed)
+    years = sorted(years or regular_tax_table)
+    return [
+        generate_household(rng, profile or rng.choice(PROFILES), rng.choice(years))
+        for _ in range(n)]
+
+
+def generate_household(rng, profile, year):
+    wages = {
+        'wages': rng.uniform(20000, 250000),
+        'amt': rng.uniform(200000, 600000),
+        'qdcg': rng.uniform(0, 120000),
+        'niit': rng.uniform(150000, 2000000),
+        'rental': rng.uniform(50000, 300000),
+    }[profile]
+
+    form_w2s = [
+        _form_w2(rng, f"Employer {i}", wages * share)
+        for i, share in enumerate(_shares(rng, rng.choice([1, 1, 2])))]
+
+    form_1099s = [
+        _form_1099(rng, f"Broker {i}", profile)
+        for i in range({'qdcg': 3, 'niit': 4}.get(profile, 1))]
+
+    real_estates = [RealEstate(
+        id='Home',
+        is_primary=True,
+        taxes=rng.uniform(2000, 40000 if profile == 'amt' else 15000),
+        interests=rng.uniform(0, 30000))]
+    for i in range(rng.randint(20, 60) if profile == 'rental' else rng.choice([0, 0, 1])):
+        real_estates.append(_rental(rng, f"Rental {i}"))
+
+    return dict(
+        year=year,
+        form_w2s=form_w2s,
+        form_1099s=form_1099s,
+        real_estates=real_estates,
+        form_k1s=[FormK1(id='Partnership', income=rng.uniform(-10000, 50000))]
+            if profile == 'niit' else [],
+        capital_loss_carryover=rng.choice([0, 0, rng.uniform(0, 30000)]),
+        rental_loss_carryover=rng.uniform(0, 50000) if profile == 'rental' else 0,
+        state_tax_adjustments_for_previous_return=rng.uniform(-5000, 5000),
+        state_estimated_tax_paid_in_last_year_for_previous_return=rng.choice([0, rng.uniform(0, 5000)]),
+        car_registration=rng.uniform(0, 800),
+        gifts=rng.uniform(0, 20000),
+        federal_estimated_tax_paid=rng.choice([0, rng.uniform(0, 20000)]),
+        state_estimated_tax_paid_in_this_year_for_current_return=rng.choice([0, rng.uniform(0, 10000)]),
+    )
+
+
+def _shares(rng, n):
+    weights = [rng.random() + 0.1 for _ in range(n)]
+    return [w / sum(weights) for w in weights]
+
+
+def _form_w2(rng, id, wages):
+    state_rate = rng.uniform(0.04, 0.1)
+    return FormW2(
+        id=id,
+        wages=wages,
+        federal_income_tax_withheld=wages * rng.uniform(0.1, 0.3),
+        social_security_wages=min(wages, 137700),
+        social_security_tax_withheld=min(wages, 137700) * 0.062,
+        medicare_wages=wages,
+        medicare_tax_withheld=wages * 0.0145,
+        hsa=rng.choice([0, 3500]),
+        ca_sdi=min(wages, 118371) * 0.01,
+        state_wages=wages,
+        state_income_tax_withheld=wages * state_rate,
+    )
+
+
+def _form_1099(rng, id, profile):
+    scale = {'qdcg': 200000, 'niit': 500000}.get(profile, 20000)
+    dividends = rng.uniform(0, scale / 4)
+    return Form1099(
+        id=id,
+        interests=rng.uniform(0, scale / 20),
+        dividends=dividends,
+        qualified_dividends=dividends * rng.uniform(0.5, 1),
+        capital_gain_distributions=rng.uniform(0, scale / 20),
+        unrecaptured_1250_gain=rng.choice([0, 0, rng.uniform(0, 2000)]),
+        federal_income_tax_withheld=rng.choice([0, rng.uniform(0, 1000)]),
+        section_199A_dividends=rng.uniform(0, scale / 100),
+        foreign_tax_paid=rng.uniform(0, scale / 200),
+        private_activity_bond_interest_dividends=rng.uniform(0, 20000 if profile == 'amt' else 500),
+        short_term_capital_gain=rng.uniform(-scale / 10, scale / 10),
+        long_term_capital_gain=rng.uniform(-scale / 10, scale),
+        roth_conversion_gain=rng.choice([0, 0, 0, rng.uniform(0, 100000)]),
+    )
+
+
+def _rental(rng, id):
+    rents = rng.uniform(12000, 60000)
+    return RealEstate(
+        id=id,
+        rents=rents,
+        taxes=rng.uniform(2000, 10000),
+        interests=rng.uniform(0, 20000),
+        hoa=rng.choice([0, rng.uniform(0, 5000)]),
+        insurance=rng.uniform(500, 2000),
+        management=rents * rng.choice([0, 0.08]),
+        repairs=rng.uniform(0, 5000),
+        utilities=rng.uniform(0, 2000),
+        depreciation=rng.uniform(5000, 20000),
+        other=rng.uniform(0, 1000),
+    )
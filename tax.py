@@ -1,29 +1,108 @@
+from collections import deque
+
 import argparse
 import importlib
+import json
 import logging
-import matplotlib.pyplot as plt
+import sys
 
 from federal_tax_computer import RegularTaxComputer, AMTTaxComputer
+from household import HouseholdTaxComputer
 from state_tax_computer import StateTaxComputer
+from tracing import tracer, log_record
 
+# Only what every run needs is imported above; the plotting stack,
+# streaming, curves, sweeps and profiling are imported when they are asked for.
 
-if __name__ == '__main__':
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('file',
-                        help='python module with tax info')
+                        help='python module with tax info, or a .csv or .jsonl file of households')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=1,
+                        help='worker processes for .csv and .jsonl input')
     parser.add_argument('-e', '--extrapolate',
                         action='store_true',
                         help='extrapolation analysis')
-    args = parser.parse_args()
+    parser.add_argument('-s', '--sweep',
+                        action='append',
+                        metavar='INPUT=START:STOP:COUNT',
+                        help='print the taxes over a grid of an aggregated input, as CSV;'
+                             ' repeat for more dimensions')
+    parser.add_argument('-p', '--profile',
+                        action='store_true',
+                        help='report evaluations, cache hits and time per attribute')
+    parser.add_argument('-j', '--json',
+                        action='store_true',
+                        help='print the results, and curves with -e and grids with -s, as JSON'
+                             ' instead of a report')
+    parser.add_argument('--trace-json',
+                        metavar='FILE',
+                        help='write the computation trace to FILE as JSON')
+    args = parser.parse_args(argv)
+
+    streaming = args.file.endswith(('.csv', '.jsonl'))
+    if streaming and args.trace_json:
+        parser.error('--trace-json is not supported for .csv and .jsonl input')
+
+    if args.json:
+        level = logging.WARNING
+    elif args.extrapolate or args.sweep or streaming:
+        level = logging.INFO
+    else:
+        level = logging.DEBUG
+    logging.basicConfig(level=level, format='%(funcName)s [%(lineno)d]: %(message)s')
+
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        tracer.enable(echo=log_record)
+    elif args.trace_json and not streaming:
+        tracer.enable()
+
+    if streaming:
+        from household import compute_many
+        from household_reader import read_household_lines
+
+        # One bad household is reported with its line and skipped, rather
+        # than ending a run over millions of them.
+        failures = 0
+
+        def report(line, household_id, error):
+            nonlocal failures
+            failures += 1
+            logging.error(f"{args.file}:{line}: household {household_id}: {type(error).__name__}: {error}")
+
+        households_read = deque()
+
+        def households():
+            for line, household_id, household in read_household_lines(args.file, on_error=report):
+                households_read.append((line, household_id))
+                yield household
 
-    logging.basicConfig(
-        level=logging.DEBUG if not args.extrapolate else logging.INFO,
-        format='%(funcName)s [%(lineno)d]: %(message)s')
+        for result in compute_many(households(), workers=args.workers, return_exceptions=True):
+            line, household_id = households_read.popleft()
+            if isinstance(result, Exception):
+                report(line, household_id, result)
+                continue
+            print(json.dumps({'household': household_id, **result._asdict()}))
+        if failures:
+            logging.error(f"{failures} households failed")
+            return 1
+        return
+
+    computers = RegularTaxComputer, AMTTaxComputer, StateTaxComputer
+    if args.profile:
+        from profiling import Profiler
+
+        profiler = Profiler()
+        computers = [profiler.instrument(computer) for computer in computers]
 
     numbers = importlib.import_module(args.file)
 
     params = {
         k: numbers.__dict__[k] for k in dir(numbers) if not k.startswith('__')}
+    household = HouseholdTaxComputer(params, computers)
 
     G = '\033[92m'
     Y = '\033[93m'
@@ -32,7 +111,7 @@ if __name__ == '__main__':
     E = '\033[0m'
 
     logging.info(G + "========== Regular Tax ==========" + E)
-    rtc = RegularTaxComputer(**params)
+    rtc = household.regular
     logging.info(f"W2: {rtc.w2:.0f}")
     logging.info(f"Interest: {rtc.interests:.0f}")
     logging.info(f"Dividends: {rtc.dividends:.0f}")
@@ -58,7 +137,7 @@ if __name__ == '__main__':
     logging.info(G + f"    Net investment income tax: {rtc.net_investment_income_tax:.0f}" + E)
 
     logging.info(R + "========== AMT Tax ==========" + E)
-    atc = AMTTaxComputer(**params)
+    atc = household.amt
     logging.info(f"Taxable income: {atc.taxable_income:.0f}")
     logging.info(f"Itemized deduction: {atc.itemized_deduction:.0f}")
     logging.info(f"Exemption: {atc.exemption:.0f}")
@@ -69,7 +148,7 @@ if __name__ == '__main__':
     logging.info(C + f"Fedaral tax due: {(max(rtc.tax, atc.tax) + rtc.additional_medicare_tax + rtc.net_investment_income_tax - rtc.credits - rtc.tax_withheld + rtc.penalty):.0f}" + E)
 
     logging.info(Y + "========== State Tax ==========" + E)
-    stc = StateTaxComputer(**params)
+    stc = household.state
     logging.info(f"CA adjusted AGI: {stc.ca_adjusted_agi:.0f}")
     logging.info(f"Itemized deduction: {stc.itemized_deduction:.0f}")
     logging.info(f"Taxable income: {stc.taxable_income:.0f}")
@@ -79,24 +158,69 @@ if __name__ == '__main__':
     logging.info(f"State tax withheld {stc.tax_withheld:.0f}")
     logging.info(C + f"State tax due: {(stc.tax + stc.mental_health_services_tax - stc.tax_withheld):.0f}" + E)
 
+    if args.profile:
+        logging.info("\n" + profiler.format_table())
+
+    output = household.result._asdict()
+
+    if args.trace_json:
+        with open(args.trace_json, 'w') as f:
+            f.write(tracer.render_json())
+        tracer.disable()
+
     if args.extrapolate:
-        deltas = range(0, 200001, 10000)
-        regular_taxes = []
-        amt_taxes = []
-        for delta in deltas:
-            rtc2 = RegularTaxComputer(**params)
-            rtc2.long_term_capital_gain = rtc.long_term_capital_gain + delta
-            regular_taxes.append(rtc2.tax)
-            atc2 = AMTTaxComputer(**params)
-            atc2.long_term_capital_gain = rtc.long_term_capital_gain + delta
-            amt_taxes.append(atc2.tax)
+        from piecewise import tax_curves, vertices
+
+        start = rtc.long_term_capital_gain
+        curves = tax_curves(params, 'long_term_capital_gain', start, start + 200000)
+        for name, segments in curves.items():
+            logging.info(f"{name}: {len(segments)} segments from {segments.evaluations} evaluations")
+            if not segments.complete:
+                logging.warning(f"{name}: out of evaluations, the rest of the range is one chord")
+            for segment in segments:
+                logging.info(f"    {segment.start - start:10.0f} .. {segment.end - start:10.0f}"
+                             f"  tax {segment.value:10.0f}  marginal rate {segment.slope:.4f}")
+        output['curves'] = {
+            name: [segment._asdict() for segment in segments]
+            for name, segments in curves.items()}
+
+    if args.sweep:
+        import csv
+        from sweep import FIELDS, sweep, rows, parse_axis
+
+        try:
+            axes = dict(parse_axis(axis) for axis in args.sweep)
+            grid = sweep(params, axes)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.json:
+            output['sweep'] = {
+                'axes': {name: values.tolist() for name, values in grid.axes.items()},
+                'values': {field: values.tolist() for field, values in grid.values.items()}}
+        else:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(list(grid.axes) + list(FIELDS))
+            writer.writerows(rows(grid))
+
+    if args.json:
+        print(json.dumps(output))
+    elif args.extrapolate:
+        import matplotlib.pyplot as plt
 
         fig, ax = plt.subplots()
-        ax.plot(deltas, regular_taxes, 'bo-', label='Regular Tax')
-        ax.plot(deltas, amt_taxes, 'rs--', label='AMT Tax')
+        for name, style, label in (
+                ('regular', 'bo-', 'Regular Tax'),
+                ('amt', 'rs--', 'AMT Tax'),
+                ('state', 'g^:', 'State Tax')):
+            xs, ys = vertices(curves[name])
+            ax.plot([x - start for x in xs], ys, style, label=label)
         actual_tax = max(rtc.tax, atc.tax)
         ax.plot(0, actual_tax,
                 'y*', markersize=20, label='Actual Tax')
         legend = ax.legend(loc='upper center', shadow=True)
         plt.grid(True)
         plt.show()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
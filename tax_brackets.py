@@ -0,0 +1,53 @@
+from bisect import bisect_left
+
+
+class TaxBrackets(tuple):
+    """(boundary, taxrate) pairs compiled for O(log n) lookups.
+
+    Alongside the pairs themselves, the boundaries, the tax rates and the
+    cumulative tax owed at each boundary are kept, so that applying the
+    brackets to an amount is one bisect and one multiply-add.
+    """
+
+    def __new__(cls, brackets):
+        self = super().__new__(cls, (tuple(bracket) for bracket in brackets))
+        self.boundaries = tuple(boundary for boundary, _ in self)
+        self.taxrates = tuple(taxrate for _, taxrate in self)
+        cumulative = [0]
+        for (lower, taxrate), upper in zip(self, self.boundaries[1:]):
+            cumulative.append(cumulative[-1] + (upper - lower) * taxrate)
+        self.cumulative = tuple(cumulative)
+        return self
+
+
+    def apply(self, amount):
+        i = bisect_left(self.boundaries, amount) - 1
+        if i < 0:
+            return 0
+        return self.cumulative[i] + (amount - self.boundaries[i]) * self.taxrates[i]
+
+
+class QDCGThresholds(tuple):
+    """(threshold, taxrate) pairs of the qualified dividends and capital gain
+    tax worksheet.
+
+    Each rate applies to the part of the qualified dividends and capital gain
+    that, stacked on top of ordinary income, falls below its threshold and
+    above the previous one. That is a bracket schedule evaluated at the top
+    and at the bottom of the stack.
+    """
+
+    def __new__(cls, thresholds):
+        self = super().__new__(cls, (tuple(threshold) for threshold in thresholds))
+        self.brackets = TaxBrackets(
+            [(0, self[0][1])]
+            + [(lower, taxrate) for (lower, _), (_, taxrate) in zip(self, self[1:])]
+            + [(self[-1][0], 0)])
+        return self
+
+
+    def apply(self, taxable_income, qdcg):
+        qdcg = min(taxable_income, qdcg)
+        return (
+            self.brackets.apply(taxable_income)
+            - self.brackets.apply(taxable_income - qdcg))
@@ -0,0 +1,280 @@
+"""Long-running tax computation service.
+
+    python3 tax_server.py --port 8737 --workers 4
+    python3 tax_server.py --unix-socket /tmp/tax.sock
+
+The tables and computers are loaded once, and worker processes are started
+once, so a request costs only its computation. Households are JSON objects
+as read by household_reader.household_from_json.
+
+    POST /compute        one household; responds with its TaxResult
+    POST /compute_many   a list of households; responds with a list
+    GET  /metrics        request counts, errors and latency percentiles
+
+TaxClient talks to the service over HTTP or the Unix socket.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from household import compute_household, warm_tables
+from household_reader import household_from_json, household_to_json
+
+
+ENDPOINTS = ('/compute', '/compute_many', '/metrics')
+
+
+class Metrics:
+    """Counts and recent latencies per endpoint, safe across threads."""
+
+    def __init__(self, window=10000):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.requests = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.latencies = {endpoint: deque(maxlen=window) for endpoint in ENDPOINTS}
+        self.households = 0
+
+
+    def record(self, endpoint, elapsed, households=0, error=False):
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.errors[endpoint] += error
+            self.latencies[endpoint].append(elapsed)
+            self.households += households
+
+
+    def as_dict(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint in ENDPOINTS:
+                latencies = list(self.latencies[endpoint])
+                endpoints[endpoint] = {
+                    'requests': self.requests[endpoint],
+                    'errors': self.errors[endpoint],
+                }
+                if len(latencies) >= 2:
+                    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+                    endpoints[endpoint]['latency_ms'] = {
+                        f"p{p}": quantiles[p - 1] * 1e3 for p in (50, 90, 99)}
+            return {
+                'uptime': time.time() - self.started,
+                'households': self.households,
+                'endpoints': endpoints,
+            }
+
+
+class TaxService:
+    """Computes households in this thread, or on a pool of `workers`
+    processes started once with the tables warmed."""
+
+    def __init__(self, workers=1, chunksize=64):
+        self.chunksize = chunksize
+        self.metrics = Metrics()
+        self.executor = None
+        if workers != 1:
+            self.executor = ProcessPoolExecutor(workers, initializer=warm_tables)
+        warm_tables()
+
+
+    def compute(self, household):
+        if self.executor is None:
+            return compute_household(household)
+        return self.executor.submit(compute_household, household).result()
+
+
+    def compute_many(self, households):
+        if self.executor is None:
+            return list(map(compute_household, households))
+        return list(self.executor.map(compute_household, households, chunksize=self.chunksize))
+
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class TaxRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            return self.respond(404, {'error': f"no such endpoint {self.path}"})
+        start = time.perf_counter()
+        metrics = self.server.service.metrics
+        response = metrics.as_dict()
+        metrics.record('/metrics', time.perf_counter() - start)
+        self.respond(200, response)
+
+
+    def do_POST(self):
+        if self.path not in ('/compute', '/compute_many'):
+            return self.respond(404, {'error': f"no such endpoint {self.path}"})
+        service = self.server.service
+        start = time.perf_counter()
+        households = 0
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if self.path == '/compute':
+                request = household_from_json(body)
+            else:
+                request = [household_from_json(h) for h in body]
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            service.metrics.record(self.path, time.perf_counter() - start, error=True)
+            return self.respond(400, {'error': f"{type(e).__name__}: {e}"})
+        try:
+            if self.path == '/compute':
+                households = 1
+                response = service.compute(request)._asdict()
+            else:
+                households = len(request)
+                response = [result._asdict() for result in service.compute_many(request)]
+        except Exception as e:
+            # A household the computers cannot handle (ZeroDivisionError on
+            # zero AGI, say) must not kill the handler thread unanswered.
+            service.metrics.record(self.path, time.perf_counter() - start, error=True)
+            return self.respond(500, {'error': f"{type(e).__name__}: {e}"})
+        service.metrics.record(self.path, time.perf_counter() - start, households)
+        self.respond(200, response)
+
+
+    def respond(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TaxHTTPServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, TaxRequestHandler)
+
+
+class TaxUnixRequestHandler(TaxRequestHandler):
+
+    def address_string(self):
+        return 'unix'
+
+
+class TaxUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        self.service = service
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, TaxUnixRequestHandler)
+
+
+def make_server(host='127.0.0.1', port=8737, unix_socket=None, workers=1):
+    """A server over a new TaxService, not yet serving. Port 0 picks a
+    free port, found in server.server_address."""
+    service = TaxService(workers)
+    if unix_socket:
+        return TaxUnixServer(unix_socket, service)
+    return TaxHTTPServer((host, port), service)
+
+
+class TaxClient:
+    """Client of the service at an http:// URL or a Unix socket path."""
+
+    def __init__(self, url='http://127.0.0.1:8737', unix_socket=None, timeout=60):
+        self.url = url.rstrip('/')
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+
+    def compute(self, household):
+        """Result of one household, given as TaxComputer keyword arguments,
+        as a dict keyed by defs.fields_result."""
+        return self.request('POST', '/compute', household_to_json(household))
+
+
+    def compute_many(self, households):
+        return self.request('POST', '/compute_many', [household_to_json(h) for h in households])
+
+
+    def metrics(self):
+        return self.request('GET', '/metrics')
+
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.unix_socket:
+            connection = UnixHTTPConnection(self.unix_socket, self.timeout)
+            try:
+                connection.request(method, path, data, headers)
+                response = connection.getresponse()
+                result = json.loads(response.read())
+            finally:
+                connection.close()
+            if response.status != 200:
+                raise ValueError(result.get('error', response.reason))
+            return result
+
+        request = urllib.request.Request(self.url + path, data, headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise ValueError(json.loads(e.read()).get('error', e.reason)) from None
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8737)
+    parser.add_argument('--unix-socket',
+                        help='listen on this Unix socket instead of HTTP')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=1,
+                        help='worker processes; 1 computes in the request threads')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.unix_socket, args.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
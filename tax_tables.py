@@ -0,0 +1,210 @@
+"""Tax parameters of every year, read from the data files in tables/.
+
+tables/<year>.json holds the parameters of one year:
+
+    {
+        "year": 2020,
+        "regular": {RegularTaxParameters fields},
+        "amt": {AMTTaxParameters fields but qdcg_thresholds},
+        "state": {StateTaxParameters fields}
+    }
+
+Brackets and qdcg thresholds are lists of [boundary, taxrate] pairs; a null
+boundary or limit_threshold stands for no limit. The AMT applies the qdcg
+thresholds of the regular table of the same year.
+
+A year is read, validated and compiled the first time any of its tables is
+used. The compiled year is pickled to tables/__pycache__, keyed by the hash
+of its file and of the code compiling it, so later processes load it
+without parsing or validating.
+"""
+from collections import namedtuple
+from collections.abc import Mapping
+
+import hashlib
+import os
+import pickle
+import sys
+
+from tax_brackets import TaxBrackets, QDCGThresholds
+
+
+TABLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+SNAPSHOTS = os.path.join(TABLES, '__pycache__')
+
+RegularTaxParameters = namedtuple('RegularTaxParameters', [
+    'social_security_max_wage',
+    'social_security_taxrate',
+    'brackets',
+    'qdcg_thresholds',
+    'limit_threshold',
+    'exemption',
+    'standard_deduction',
+])
+
+AMTTaxParameters = namedtuple('AMTTaxParameters', [
+    'brackets',
+    'qdcg_thresholds',
+    'limit_threshold',
+    'exemption',
+])
+
+StateTaxParameters = namedtuple('StateTaxParameters', [
+    'ca_sdi_vpdi_max_wage',
+    'ca_sdi_vpdi_taxrate',
+    'brackets',
+    'limit_threshold',
+    'exemption',
+    'standard_deduction',
+])
+
+TaxYear = namedtuple('TaxYear', ['regular', 'amt', 'state'])
+
+PARAMETERS = TaxYear(RegularTaxParameters, AMTTaxParameters, StateTaxParameters)
+
+TAXRATES = ('social_security_taxrate', 'ca_sdi_vpdi_taxrate')
+
+_years = {}
+_compiler = []
+
+
+def years():
+    """Years that have a data file, in order."""
+    return sorted(
+        int(name[:-len('.json')]) for name in os.listdir(TABLES)
+        if name.endswith('.json') and name[:-len('.json')].isdigit())
+
+
+def data_files():
+    return [os.path.join(TABLES, f"{year}.json") for year in years()]
+
+
+def load(year):
+    """TaxYear of compiled parameters of year."""
+    tax_year = _years.get(year)
+    if tax_year is None:
+        tax_year = _years[year] = _load(year)
+    return tax_year
+
+
+def _load(year):
+    path = os.path.join(TABLES, f"{year}.json")
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise KeyError(year) from None
+
+    digest = hashlib.sha256(data)
+    digest.update(_compiler_digest())
+    snapshot = os.path.join(SNAPSHOTS, f"{year}.{digest.hexdigest()[:16]}.pickle")
+    try:
+        with open(snapshot, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    import json
+    tax_year = compile_year(year, json.loads(data))
+    try:
+        os.makedirs(SNAPSHOTS, exist_ok=True)
+        temporary = f"{snapshot}.{os.getpid()}"
+        with open(temporary, 'wb') as f:
+            pickle.dump(tax_year, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, snapshot)
+    except OSError:
+        pass
+    return tax_year
+
+
+def _compiler_digest():
+    """Hash of this module and of tax_brackets, which the snapshots depend on."""
+    if not _compiler:
+        digest = hashlib.sha256()
+        for module in (__file__, os.path.join(os.path.dirname(__file__), 'tax_brackets.py')):
+            with open(module, 'rb') as f:
+                digest.update(f.read())
+        _compiler.append(digest.digest())
+    return _compiler[0]
+
+
+def compile_year(year, data):
+    """TaxYear of the parameters of year as read from its data file,
+    validated. Raises ValueError naming the offending field."""
+    if data.get('year') != year:
+        raise ValueError(f"{year}: file is for year {data.get('year')!r}")
+    sections = {}
+    for kind, params in zip(TaxYear._fields, PARAMETERS):
+        section = data.get(kind)
+        if not isinstance(section, dict):
+            raise ValueError(f"{year}: no {kind} table")
+        fields = set(params._fields) - ({'qdcg_thresholds'} if kind == 'amt' else set())
+        if set(section) != fields:
+            raise ValueError(
+                f"{year} {kind}: missing {sorted(fields - set(section))},"
+                f" unknown {sorted(set(section) - fields)}")
+        sections[kind] = {
+            field: _validate(f"{year} {kind} {field}", field, value)
+            for field, value in section.items()}
+    regular = sections['regular']
+    if max(taxrate for _, taxrate in regular['qdcg_thresholds']) > regular['brackets'][-1][1]:
+        raise ValueError(f"{year}: qdcg taxrates exceed the top regular taxrate")
+    if regular['qdcg_thresholds'][-1][0] != sys.maxsize:
+        raise ValueError(f"{year}: the last qdcg threshold is not null")
+
+    for section in sections.values():
+        section['brackets'] = TaxBrackets(section['brackets'])
+    regular['qdcg_thresholds'] = QDCGThresholds(regular['qdcg_thresholds'])
+    sections['amt']['qdcg_thresholds'] = regular['qdcg_thresholds']
+    return TaxYear(*(
+        params(**sections[kind]) for kind, params in zip(TaxYear._fields, PARAMETERS)))
+
+
+def _validate(name, field, value):
+    if field in ('brackets', 'qdcg_thresholds'):
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"{name}: not a list of [boundary, taxrate] pairs")
+        pairs = []
+        for pair in value:
+            if not isinstance(pair, list) or len(pair) != 2:
+                raise ValueError(f"{name}: {pair!r} is not a [boundary, taxrate] pair")
+            boundary, taxrate = pair
+            pairs.append((
+                _validate(name, 'boundary', boundary),
+                _validate(name, 'taxrate', taxrate)))
+        boundaries = [boundary for boundary, _ in pairs]
+        if field == 'brackets' and boundaries[0] != 0:
+            raise ValueError(f"{name}: the first boundary is not 0")
+        if any(lower >= upper for lower, upper in zip(boundaries, boundaries[1:])):
+            raise ValueError(f"{name}: boundaries are not increasing")
+        return pairs
+
+    if value is None and field in ('boundary', 'limit_threshold'):
+        return sys.maxsize
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name}: {value!r} is not a number")
+    if field == 'taxrate' or field in TAXRATES:
+        if not 0 <= value <= 1:
+            raise ValueError(f"{name}: taxrate {value!r} is not in [0, 1]")
+    elif value < 0:
+        raise ValueError(f"{name}: {value!r} is negative")
+    return value
+
+
+class YearTable(Mapping):
+    """One kind of parameters, 'regular', 'amt' or 'state', keyed by year."""
+
+    def __init__(self, kind):
+        self.kind = kind
+
+
+    def __getitem__(self, year):
+        return getattr(load(year), self.kind)
+
+
+    def __iter__(self):
+        return iter(years())
+
+
+    def __len__(self):
+        return len(years())
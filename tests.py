@@ -1,8 +1,47 @@
+from datetime import date
+
 import importlib
+import itertools
+import io
+import json
+import math
+import random
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
 
+import numpy as np
+
+from aggregator import aggregate_forms, aggregate_household
+from batch_tax_computer import columns_from_households, compute_batch
+from cents import to_cents, to_dollars, compute_household_cents, compute_batch_cents, columns_from_households_cents, whole_dollar_totals
+from benchmarks.bench_brackets import walk_tax_brackets
+from defs import FormW2, Form1099, RealEstate, FormK1, fields_result
+from differential import Engine, TOLERANCE_CENTS, run, whole_dollar_reference
 from federal_tax_computer import RegularTaxComputer, AMTTaxComputer
+from federal_tax_table import regular_tax_table
+from household import HouseholdTaxComputer, compute_household, compute_many, tax_result
+from household_reader import read_households, read_household_lines, household_from_json, household_to_json
+from household_store import write_store, open_store, compute_store
+from incremental import IncrementalRegularTaxComputer, IncrementalAMTTaxComputer, IncrementalStateTaxComputer
+from lots import LotEngine, Purchase, Sale, is_long_term, read_trades
+from monte_carlo import simulate, Normal, LogNormal, Empirical
+from pipeline import CarryoverPipeline
+from piecewise import segments, tax_curves, evaluate
+from profiling import Profiler
+from rental_portfolio import RentalPortfolio
+from result_cache import ResultCache, SOURCES
+from roth_optimizer import optimize_conversions, conversion_costs
+from sensitivity import sensitivities, marginal_rates, batch_marginal_rates, DualArray, DUAL_COMPUTERS, INPUTS
 from state_tax_computer import StateTaxComputer
+from state_tax_table import state_tax_table
+from synthetic import generate_households
+from sweep import FIELDS, sweep, rows
+from tax_server import make_server, TaxClient
+from tax_tables import TABLES, compile_year, load, years
+from tracing import tracer, log_record
 
 
 class TestRedshiftInterface(unittest.TestCase):
@@ -84,5 +123,846 @@ class TestRedshiftInterface(unittest.TestCase):
         self._test('data.jiayan_2020')
 
 
+class TestTaxBrackets(unittest.TestCase):
+
+    def test_matches_bracket_walk(self):
+        rng = random.Random(0)
+        for table in (regular_tax_table, state_tax_table):
+            for params in table.values():
+                for amount in [0, -5, 1e7] + [b for b, _ in params.brackets] + [
+                        rng.uniform(0, 1e6) for _ in range(100)]:
+                    self.assertAlmostEqual(
+                        params.brackets.apply(amount),
+                        walk_tax_brackets(params.brackets, amount), places=6)
+
+    def test_qdcg_thresholds(self):
+        thresholds = regular_tax_table[2020].qdcg_thresholds
+        self.assertEqual(thresholds.apply(30000, 10000), 0)
+        self.assertAlmostEqual(thresholds.apply(50000, 20000), 10000 * 0.15)
+        self.assertAlmostEqual(
+            thresholds.apply(500000, 100000), 41450 * 0.15 + 58550 * 0.2)
+        self.assertEqual(thresholds.apply(-1000, 5000), 0)
+
+
+class TestTaxTables(unittest.TestCase):
+
+    def read(self, year):
+        with open(f"{TABLES}/{year}.json") as f:
+            return json.load(f)
+
+    def test_loads_every_year(self):
+        self.assertEqual(list(regular_tax_table), years())
+        for year in years():
+            self.assertEqual(compile_year(year, self.read(year)), load(year))
+            self.assertIs(load(year).amt.qdcg_thresholds, load(year).regular.qdcg_thresholds)
+        self.assertNotIn(1999, regular_tax_table)
+
+    def test_validation(self):
+        def invalid(edit):
+            data = self.read(2020)
+            edit(data)
+            with self.assertRaises(ValueError):
+                compile_year(2020, data)
+
+        invalid(lambda data: data['regular']['brackets'].reverse())
+        invalid(lambda data: data['state']['brackets'][0].__setitem__(0, 100))
+        invalid(lambda data: data['amt']['brackets'][1].__setitem__(1, 28))
+        invalid(lambda data: data['regular'].__setitem__('exemption', -1))
+        invalid(lambda data: data['state'].pop('exemption'))
+        invalid(lambda data: data['amt'].__setitem__('qdcg_thresholds', []))
+        invalid(lambda data: data.pop('state'))
+        invalid(lambda data: data['regular']['qdcg_thresholds'][-1].__setitem__(1, 0.5))
+        invalid(lambda data: data.__setitem__('year', 2019))
+
+
+class TestBatchTaxComputer(unittest.TestCase):
+
+    def test_matches_scalar_computers(self):
+        households = generate_households(300)
+        results = compute_batch(columns_from_households(households))
+        for i, params in enumerate(households):
+            rtc = RegularTaxComputer(**params)
+            atc = AMTTaxComputer(**params)
+            stc = StateTaxComputer(**params)
+            self.assertEqual(results['regular_tax'][i], rtc.tax)
+            self.assertEqual(results['amt'][i], max(0, atc.tax - rtc.tax))
+            self.assertEqual(results['net_investment_income_tax'][i], rtc.net_investment_income_tax)
+            self.assertEqual(results['additional_medicare_tax'][i], rtc.additional_medicare_tax)
+            self.assertEqual(results['state_tax'][i], stc.tax)
+            self.assertEqual(results['mental_health_services_tax'][i], stc.mental_health_services_tax)
+            self.assertEqual(
+                results['federal_tax_due'][i],
+                max(rtc.tax, atc.tax)
+                + rtc.additional_medicare_tax
+                + rtc.net_investment_income_tax
+                - rtc.credits
+                - rtc.tax_withheld
+                + rtc.penalty)
+            self.assertEqual(
+                results['state_tax_due'][i],
+                stc.tax + stc.mental_health_services_tax - stc.tax_withheld)
+
+    def test_salt_cap(self):
+        households = [dict(h, year=year) for year in (2017, 2018) for h in generate_households(1)]
+        households[0]['real_estates'] = households[1]['real_estates'] = [
+            RealEstate(id='Primary', is_primary=True, taxes=30000)]
+        results = compute_batch(columns_from_households(households))
+        for i, params in enumerate(households):
+            self.assertEqual(results['regular_tax'][i], RegularTaxComputer(**params).tax)
+
+
+class TestCents(unittest.TestCase):
+
+    def test_rounding(self):
+        self.assertEqual(to_cents(1.005), 101)
+        self.assertEqual(to_cents(-0.125), -13)
+        self.assertEqual([to_dollars(c) for c in (149, 150, -150, -149)], [1, 2, -2, -1])
+        household = generate_households(1, seed=6)[0]
+        totals = whole_dollar_totals({**household, 'gifts': 2.495, 'capital_loss_carryover': 2.494})
+        self.assertEqual((totals['gifts'], totals['capital_loss_carryover']), (3, 2))
+
+        columns = columns_from_households_cents([household])
+        with self.assertRaises(OverflowError):
+            compute_batch_cents({**columns, 'w2': np.array([10 ** 14], dtype=np.int64)})
+        with self.assertRaises(TypeError):
+            compute_batch_cents({**columns, 'w2': columns['w2'] / 100})
+        with self.assertRaises(KeyError):
+            compute_batch_cents({**columns, 'year': np.array([1900])})
+
+    def test_scalar_matches_batch(self):
+        households = generate_households(300, seed=6)
+        results = compute_batch_cents(columns_from_households_cents(households))
+        for i, household in enumerate(households):
+            result = compute_household_cents(household)
+            expected = whole_dollar_reference(household)
+            for field in fields_result:
+                self.assertEqual(results[field][i], getattr(result, field))
+                if field != 'year':
+                    self.assertIsInstance(getattr(result, field), int)
+                    self.assertEqual(getattr(result, field) % 100, 0)
+                    self.assertAlmostEqual(
+                        getattr(result, field) / 100, getattr(expected, field), delta=TOLERANCE_CENTS)
+
+
+def _overtaxing_gains(households):
+    return [
+        result._replace(federal_tax_due=result.federal_tax_due + (
+            5 if aggregate_household(**household)['long_term_capital_gain'] > 10000 else 0))
+        for household, result in zip(households, map(compute_household, households))]
+
+
+def _failing_on_gains(households):
+    for household in households:
+        if aggregate_household(**household)['long_term_capital_gain'] > 10000:
+            raise ZeroDivisionError('gains')
+    return list(map(compute_household, households))
+
+
+class TestDifferential(unittest.TestCase):
+
+    def test_engines_agree(self):
+        for engine in ('household', 'batch', 'cents_batch'):
+            report = run(engine, 300, workers=2, chunk=100)
+            self.assertEqual((report.cases, report.mismatches), (300, 0))
+
+    def test_shrinks_mismatch(self):
+        report = run(Engine(_overtaxing_gains, 0), 50, workers=1, chunk=10, shrink_limit=1)
+        self.assertGreater(report.mismatches, 1)
+        [mismatch] = report.shrunk
+        self.assertEqual(mismatch.field, 'federal_tax_due')
+        household = mismatch.household
+        self.assertEqual(len(household['form_1099s']), 1)
+        self.assertFalse(household['form_w2s'] or household['real_estates'] or household['form_k1s'])
+        amounts = [value for value in household['form_1099s'][0][1:] if value]
+        self.assertEqual(len(amounts), 1)
+        self.assertTrue(10000 < amounts[0] <= 20000)
+
+    def test_engine_errors(self):
+        report = run(Engine(_failing_on_gains, 0), 50, workers=1, shrink_limit=1)
+        self.assertGreater(report.mismatches, 0)
+        self.assertLess(report.mismatches, 50)
+        [mismatch] = report.shrunk
+        self.assertEqual((mismatch.field, mismatch.actual), (None, 'ZeroDivisionError: gains'))
+        self.assertEqual(len(mismatch.household['form_1099s']), 1)
+        self.assertFalse(mismatch.household['form_w2s'])
+
+
+class TestHouseholdTaxComputer(unittest.TestCase):
+
+    def test_same_as_separate_computers(self):
+        for params in generate_households(50, seed=9):
+            household = HouseholdTaxComputer(params)
+            self.assertEqual(household.result, tax_result(
+                RegularTaxComputer(**params),
+                AMTTaxComputer(**params),
+                StateTaxComputer(**params)))
+
+    def test_shared(self):
+        household = HouseholdTaxComputer(generate_households(1)[0])
+        for name in HouseholdTaxComputer.SHARED:
+            self.assertIn(name, household.amt.__dict__)
+            self.assertIn(name, household.state.__dict__)
+        self.assertIs(household.amt.w2, household.regular.w2)
+
+
+class TestComputeMany(unittest.TestCase):
+
+    def test_ordered(self):
+        households = generate_households(50)
+        expected = [compute_household(household) for household in households]
+        self.assertEqual(list(compute_many(households, workers=2, chunksize=7)), expected)
+        self.assertEqual(list(compute_many(iter(households), workers=1)), expected)
+
+    def test_as_completed(self):
+        households = generate_households(50)
+        results = dict(compute_many(households, workers=2, chunksize=4, ordered=False))
+        self.assertEqual(
+            [results[i] for i in range(len(households))],
+            [compute_household(household) for household in households])
+
+    def test_error(self):
+        households = generate_households(50) + [{'year': 2020, 'form_w2s': [], 'form_1099s': [], 'real_estates': []}]
+        with self.assertRaises(ZeroDivisionError):
+            list(compute_many(households, workers=2, chunksize=4))
+        results = list(compute_many(households, workers=2, chunksize=4, return_exceptions=True))
+        self.assertIsInstance(results[-1], ZeroDivisionError)
+        self.assertEqual(results[:-1], [compute_household(h) for h in households[:-1]])
+
+
+class TestIncrementalComputers(unittest.TestCase):
+
+    def test_matches_fresh_computers(self):
+        for params in generate_households(30):
+            for incremental, computer in (
+                    (IncrementalRegularTaxComputer, RegularTaxComputer),
+                    (IncrementalAMTTaxComputer, AMTTaxComputer),
+                    (IncrementalStateTaxComputer, StateTaxComputer)):
+                itc = incremental(**params)
+                itc.tax
+                for delta in (0, 50000, 250000):
+                    tc = computer(**params)
+                    tc.long_term_capital_gain += delta
+                    tc.gifts += delta / 10
+                    itc.update(
+                        long_term_capital_gain=tc.long_term_capital_gain,
+                        gifts=tc.gifts)
+                    self.assertEqual(itc.tax, tc.tax)
+                    self.assertEqual(itc.taxable_income, tc.taxable_income)
+
+    def test_invalidates_only_dependents(self):
+        rtc = IncrementalRegularTaxComputer(**generate_households(1)[0])
+        rtc.tax, rtc.tax_withheld, rtc.additional_medicare_tax
+        rtc.long_term_capital_gain += 1000
+        self.assertNotIn('tax', rtc.__dict__)
+        self.assertNotIn('exemption', rtc.__dict__)
+        self.assertIn('tax_withheld', rtc.__dict__)
+        self.assertIn('additional_medicare_tax', rtc.__dict__)
+        self.assertIn('params', rtc.__dict__)
+        with self.assertRaises(AttributeError):
+            rtc.tax = 0
+
+
+class TestAggregator(unittest.TestCase):
+
+    def _forms(self):
+        households = generate_households(40)
+        return (
+            [f for h in households for f in h['form_w2s']],
+            [f for h in households for f in h['form_1099s']],
+            [r for h in households for r in h['real_estates']],
+            [k for h in households for k in h['form_k1s']])
+
+    def test_records(self):
+        form_w2s, form_1099s, real_estates, form_k1s = self._forms()
+        totals = aggregate_forms(form_w2s, form_1099s, real_estates, form_k1s)
+        self.assertEqual(totals['w2'], sum([w2.wages for w2 in form_w2s]))
+        self.assertEqual(
+            totals['long_term_capital_gain'],
+            sum([f.long_term_capital_gain + f.capital_gain_distributions for f in form_1099s]))
+        self.assertEqual(
+            totals['primary_home_taxes'],
+            sum([r.taxes for r in real_estates if r.is_primary]))
+        self.assertEqual(
+            [i for i, _ in totals['rental_incomes']],
+            [r.id for r in real_estates if not r.is_primary])
+        self.assertEqual(aggregate_forms([], [], [])['rental_income'], 0)
+
+    def test_columns(self):
+        forms = self._forms()
+        totals = aggregate_forms(*forms)
+        columns = [
+            {field: np.array(column) for field, column in zip(type(f[0])._fields, zip(*f))}
+            for f in forms]
+        del columns[0]['ca_vpdi']
+        column_totals = aggregate_forms(*columns)
+        for name, total in totals.items():
+            if name == 'rental_incomes':
+                self.assertEqual([i for i, _ in column_totals[name]], [i for i, _ in total])
+                continue
+            self.assertAlmostEqual(column_totals[name], total, places=4)
+
+
+class TestRentalPortfolio(unittest.TestCase):
+
+    def test_running_totals(self):
+        rng = random.Random(7)
+        rentals = [r for h in generate_households(40, profile='rental') for r in h['real_estates']]
+        rentals = [r._replace(id=f"{r.id} {i}") for i, r in enumerate(rentals)]
+        portfolio = RentalPortfolio(rentals[:100])
+        for step in range(500):
+            action = rng.choice(['add', 'update', 'remove'])
+            if action == 'add' or len(portfolio) < 2:
+                real_estate = rentals[100 + step]
+                portfolio.add(real_estate)
+            elif action == 'update':
+                real_estate = rng.choice(list(portfolio))
+                portfolio.update(real_estate._replace(rents=rng.uniform(0, 100000)))
+            else:
+                portfolio.remove(rng.choice(list(portfolio)).id)
+            if step % 50 == 0:
+                totals = aggregate_forms([], [], list(portfolio))
+                self.assertEqual(portfolio.rental_income, math.fsum(portfolio.incomes.values()))
+                self.assertAlmostEqual(portfolio.rental_income, totals['rental_income'], places=6)
+                self.assertAlmostEqual(
+                    portfolio.totals()['primary_home_taxes'], totals['primary_home_taxes'], places=6)
+                self.assertEqual(aggregate_forms([], [], portfolio)['rental_incomes'], totals['rental_incomes'])
+
+    def test_household(self):
+        household = generate_households(1, seed=4, profile='rental')[0]
+        portfolio = RentalPortfolio(household['real_estates'])
+        rentals = list(portfolio.incomes)
+        portfolio.set_carryover(rentals[0], 40000)
+        portfolio.set_carryover(rentals[1], 25000.5)
+        expected = compute_household({**household, 'rental_loss_carryover': 65000.5})
+        with_portfolio = {**household, 'real_estates': portfolio, 'rental_loss_carryover': 0}
+        for field, value in zip(fields_result, compute_household(with_portfolio)):
+            self.assertAlmostEqual(value, getattr(expected, field), places=6)
+        self.assertEqual(
+            compute_household_cents(with_portfolio),
+            compute_household_cents({**household, 'rental_loss_carryover': 65000.5}))
+        with self.assertRaises(ValueError):
+            compute_household({**household, 'real_estates': portfolio})
+
+        obj = json.loads(json.dumps(household_to_json(with_portfolio)))
+        self.assertEqual(obj['rental_loss_carryovers'], {rentals[0]: 40000, rentals[1]: 25000.5})
+        self.assertEqual(compute_household(household_from_json(obj)), compute_household(with_portfolio))
+
+    def test_next_carryovers(self):
+        portfolio = RentalPortfolio([
+            RealEstate(id='A', rents=10000, depreciation=30000),
+            RealEstate(id='B', rents=20000, depreciation=5000),
+            RealEstate(id='C', rents=5000),
+            RealEstate(id='D', depreciation=20000)], carryovers={'B': 5000})
+        self.assertEqual(portfolio.rental_income, -20000)
+        self.assertEqual(portfolio.next_carryovers(), {'A': 12500, 'D': 12500})
+        portfolio.carry_over()
+        self.assertEqual(portfolio.rental_loss_carryover, 25000)
+        portfolio.remove('A')
+        self.assertEqual(portfolio.rental_loss_carryover, 12500)
+
+
+class TestTracing(unittest.TestCase):
+
+    def tearDown(self):
+        tracer.disable()
+        tracer.clear()
+
+    def test_disabled(self):
+        RegularTaxComputer(**generate_households(1)[0]).net_investment_income_tax
+        self.assertFalse(tracer.records)
+
+    def test_records(self):
+        tracer.enable()
+        rtc = RegularTaxComputer(**generate_households(1)[0])
+        rtc.net_investment_income_tax
+        steps = [(r.source, r.step) for r in tracer.records]
+        self.assertIn(('RegularTaxComputer', 'investment_income'), steps)
+        self.assertEqual(tracer.records[-1].result, rtc.net_investment_income_tax)
+        self.assertIn('RegularTaxComputer.net_investment_income_tax = ', tracer.render_text())
+        self.assertEqual(len(json.loads(tracer.render_json())), len(tracer.records))
+
+    def test_log_record(self):
+        with self.assertLogs(level='DEBUG') as logs:
+            tracer.enable(echo=log_record)
+            RegularTaxComputer(**generate_households(1)[0]).net_investment_income_tax
+        self.assertEqual(logs.records[-1].funcName, 'net_investment_income_tax')
+        self.assertTrue(logs.records[-1].pathname.endswith('federal_tax_computer.py'))
+
+    def test_max_records(self):
+        tracer.enable()
+        for i in range(tracer.records.maxlen + 10):
+            tracer.record(None, 'step', i)
+        self.assertEqual(len(tracer.records), tracer.records.maxlen)
+        self.assertEqual(tracer.records[-1].result, i)
+
+
+class TestHouseholdReader(unittest.TestCase):
+
+    def test_csv(self):
+        f = io.StringIO(
+            "household,record,year,id,wages,dividends,is_primary,taxes,gifts\n"
+            "a,household,2019,,,,,,100\n"
+            "a,w2,,Company,1000,,,,\n"
+            "a,1099,,Bank,,100,,,\n"
+            "a,real_estate,,Home,,,true,10000,\n"
+            "b,household,2020,,,,,,\n")
+        households = list(read_households(f, 'csv'))
+        self.assertEqual([i for i, _ in households], ['a', 'b'])
+        a = households[0][1]
+        self.assertEqual(a['year'], 2019)
+        self.assertEqual(a['gifts'], 100)
+        self.assertEqual(a['form_w2s'], [FormW2(id='Company', wages=1000)])
+        self.assertEqual(a['form_1099s'], [Form1099(id='Bank', dividends=100)])
+        self.assertEqual(a['real_estates'], [RealEstate(id='Home', is_primary=True, taxes=10000)])
+        self.assertEqual(households[1][1]['form_w2s'], [])
+        compute_household(a)
+
+    def test_jsonl(self):
+        f = io.StringIO(
+            '{"household": "c", "year": 2018, "form_w2s": [{"wages": 100000}]}\n'
+            '\n'
+            '{"household": "d", "record": "household", "year": 2017}\n'
+            '{"household": "d", "record": "k1", "income": 5000}\n')
+        households = dict(read_households(f, 'jsonl'))
+        self.assertEqual(households['c']['form_w2s'], [FormW2(wages=100000)])
+        self.assertEqual(households['d']['form_k1s'], [FormK1(income=5000)])
+        with self.assertRaises(ValueError):
+            list(read_households(io.StringIO('{"household": "e", "record": "w3"}'), 'jsonl'))
+
+    def test_errors(self):
+        f = io.StringIO(
+            '{"household": "a", "record": "household", "year": 2019}\n'
+            '{"household": "a", "record": "w3"}\n'
+            '{"household": "a", "record": "w2", "wages": 1000}\n'
+            'not json\n'
+            '{"household": "b", "year": 2020}\n')
+        errors = []
+        households = list(read_household_lines(
+            f, 'jsonl', on_error=lambda *error: errors.append(error[:2])))
+        self.assertEqual([(line, i) for line, i, _ in households], [(5, 'b')])
+        self.assertEqual(errors, [(2, 'a'), (4, None)])
+
+    def test_streaming_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/households.jsonl"
+            with open(path, 'w') as f:
+                f.write('{"household": "a", "year": 2020, "form_w2s": [{"wages": 100000}]}\n'
+                        '{"household": "b", "year": 2020}\n'
+                        '{"household": "c", "year": 2020, "form_w2s": [{"wages": 50000}]}\n')
+            run = subprocess.run(
+                [sys.executable, 'tax.py', path], capture_output=True, text=True)
+            self.assertEqual(run.returncode, 1)
+            self.assertEqual([json.loads(line)['household'] for line in run.stdout.splitlines()], ['a', 'c'])
+            self.assertIn(f"{path}:2: household b: ZeroDivisionError", run.stderr)
+
+            run = subprocess.run(
+                [sys.executable, 'tax.py', path, '--trace-json', 'trace.json'],
+                capture_output=True, text=True)
+            self.assertEqual(run.returncode, 2)
+            self.assertIn('--trace-json', run.stderr)
+
+
+class TestLotEngine(unittest.TestCase):
+
+    def test_holding_periods(self):
+        engine = LotEngine(2020)
+        engine.sell(Sale('X', date(2019, 6, 1), date(2018, 1, 1), 10, 900, 1000))
+        engine.sell(Sale('X', date(2020, 1, 2), date(2019, 1, 2), 10, 1100, 1000))
+        engine.sell(Sale('X', date(2020, 1, 3), date(2019, 1, 2), 10, 1200, 1000))
+        self.assertEqual(engine.form_1099('Broker'), Form1099(
+            id='Broker', short_term_capital_gain=100, long_term_capital_gain=200))
+        self.assertTrue(is_long_term(date(2020, 2, 29), date(2021, 3, 1)))
+        self.assertFalse(is_long_term(date(2020, 2, 29), date(2021, 2, 28)))
+        with self.assertRaises(ValueError):
+            engine.buy(Purchase('Y', date(2019, 12, 31), 1))
+
+    def test_wash_sales(self):
+        engine = LotEngine()
+        for trade in [
+            Purchase('X', date(2020, 1, 2), 10),
+            Purchase('Y', date(2020, 1, 20), 10),
+            Purchase('X', date(2020, 2, 15), 10),
+            Sale('X', date(2020, 3, 1), date(2020, 2, 15), 10, 500, 1000),
+            Purchase('X', date(2020, 4, 1), 10),        # 31 days later
+            Sale('X', date(2020, 4, 15), date(2020, 1, 2), 10, 500, 1000),
+            Sale('X', date(2021, 1, 15), date(2020, 4, 1), 10, 1200, 1000),
+            Purchase('X', date(2021, 1, 25), 4),
+        ]:
+            engine.add(trade)
+        # The $500 lost on April 15 goes to the shares bought on April 1,
+        # held since 104 days earlier: their sale loses $300, long term, of
+        # which $120 on 4 shares is replaced in turn.
+        self.assertEqual(engine.wash_sale_loss_disallowed, 620)
+        self.assertEqual(engine.short_term_capital_gain, -500)
+        self.assertEqual(engine.long_term_capital_gain, -180)
+
+    def test_read_trades(self):
+        f = io.StringIO(
+            "record,security,date,acquired,quantity,proceeds,cost_basis\n"
+            "buy,X,2020-01-02,,10,,\n"
+            "sell,X,2020-03-01,2020-01-02,10,500,1000\n")
+        self.assertEqual(list(read_trades(f, 'csv')), [
+            Purchase('X', date(2020, 1, 2), 10),
+            Sale('X', date(2020, 3, 1), date(2020, 1, 2), 10, 500, 1000)])
+        with self.assertRaises(ValueError):
+            list(read_trades(io.StringIO('{"record": "short"}'), 'jsonl'))
+
+
+class TestHouseholdStore(unittest.TestCase):
+
+    def test_round_trip(self):
+        households = generate_households(100)
+        expected = compute_batch(columns_from_households(households))
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(write_store(path, iter(households), chunksize=30), 100)
+            columns = open_store(path)
+            self.assertIsInstance(columns['w2'], np.memmap)
+            results = compute_batch(columns)
+            for name, values in expected.items():
+                np.testing.assert_array_equal(results[name], values)
+
+            results = compute_store(path, workers=2, chunksize=33)
+            for name, values in expected.items():
+                np.testing.assert_array_equal(results[name], values)
+
+            np.testing.assert_array_equal(
+                open_store(path, 90, 200)['year'], expected['year'][90:])
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_store(path, [])
+            self.assertEqual(len(compute_store(path)['federal_tax_due']), 0)
+
+    def test_failed_write(self):
+        def households():
+            yield from generate_households(10)
+            raise ValueError('bad input')
+
+        with tempfile.TemporaryDirectory() as path:
+            write_store(path, generate_households(5))
+            with self.assertRaises(ValueError):
+                write_store(path, households(), chunksize=4)
+            with self.assertRaises(FileNotFoundError):
+                open_store(path)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_counts(self):
+        profiler = Profiler()
+        computer = profiler.instrument(RegularTaxComputer)
+        for params in generate_households(5):
+            rtc = computer(**params)
+            self.assertEqual(rtc.tax, RegularTaxComputer(**params).tax)
+            rtc.tax
+        stats = profiler.stats
+        self.assertEqual(stats['RegularTaxComputer.tax'].evaluations, 5)
+        self.assertEqual(stats['RegularTaxComputer.tax'].hits, 5)
+        self.assertEqual(stats['RegularTaxComputer.agi'].evaluations, 5)
+        self.assertGreater(stats['RegularTaxComputer.agi'].hits, 0)
+        self.assertEqual(stats['RegularTaxComputer.compute_tax_with_qdcg'].evaluations, 5)
+        tax = stats['RegularTaxComputer.tax']
+        self.assertLessEqual(tax.self, tax.cumulative)
+        self.assertIn('RegularTaxComputer.agi', profiler.format_table())
+        self.assertEqual(profiler.as_dict()['RegularTaxComputer.tax']['hits'], 5)
+
+
+class TestPiecewise(unittest.TestCase):
+
+    def test_brackets(self):
+        brackets = regular_tax_table[2020].brackets
+        curve = segments(brackets.apply, 0, 1000000)
+        self.assertEqual(len(curve), len(brackets))
+        self.assertTrue(curve.complete)
+        self.assertEqual(curve.evaluations, len(brackets))
+        for segment, boundary, taxrate in zip(curve, brackets.boundaries, brackets.taxrates):
+            self.assertEqual(segment.start, boundary)
+            self.assertAlmostEqual(segment.slope, taxrate, places=12)
+
+    def test_tax_curves(self):
+        for params in generate_households(10, seed=3):
+            curves = tax_curves(params, 'long_term_capital_gain', 0, 300000)
+            computers = {
+                'regular': IncrementalRegularTaxComputer(**params),
+                'amt': IncrementalAMTTaxComputer(**params),
+                'state': IncrementalStateTaxComputer(**params),
+            }
+            for name, tc in computers.items():
+                # One per segment and per phase-out step, and a few for
+                # breakpoints that do not bend the tax.
+                self.assertLessEqual(curves[name].evaluations, len(curves[name]) + 300000 / 2500 + 10)
+                for x in range(0, 300001, 997):
+                    tc.long_term_capital_gain = x
+                    self.assertAlmostEqual(evaluate(curves[name], x), tc.tax, places=6)
+
+    def test_max_evaluations(self):
+        params = generate_households(10, seed=3)[2]
+        curve = tax_curves(params, 'long_term_capital_gain', 0, 300000, max_evaluations=10)['regular']
+        self.assertFalse(curve.complete)
+        self.assertEqual(curve.evaluations, 10)
+        self.assertEqual(curve[0].start, 0)
+        self.assertEqual(curve[-1].end, 300000)
+
+    def test_unknown_input(self):
+        params = generate_households(1)[0]
+        for name in ('wages', 'year'):
+            with self.assertRaises(ValueError):
+                tax_curves(params, name, 0, 100000)
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_matches_scalar_computers(self):
+        household = generate_households(1, seed=5)[0]
+        totals = aggregate_household(**household)
+        axes = {
+            'long_term_capital_gain': np.linspace(0, 300000, 7),
+            'roth_conversion_gain': [0, 50000, 100000],
+            'gifts': [0, 20000],
+        }
+        grid = sweep(household, axes, batch=10)
+        self.assertEqual(grid.values['tax_due'].shape, (7, 3, 2))
+        table = list(rows(grid))
+        self.assertEqual(len(table), 42)
+        for row in table:
+            point = dict(zip(list(axes) + list(FIELDS), row))
+            result = HouseholdTaxComputer.from_totals(
+                {**totals, **{name: point[name] for name in axes}}).result
+            for field in FIELDS[:-1]:
+                self.assertEqual(point[field], getattr(result, field))
+            self.assertEqual(point['tax_due'], result.federal_tax_due + result.state_tax_due)
+
+    def test_unknown_input(self):
+        with self.assertRaises(ValueError):
+            sweep(generate_households(1)[0], {'year': [2019, 2020]})
+
+
+class TestSensitivity(unittest.TestCase):
+
+    def test_values(self):
+        for params in generate_households(10, seed=5):
+            expected = compute_household(params)
+            for field, value in sensitivities(params)._asdict().items():
+                self.assertEqual(float(value), getattr(expected, field))
+
+    def test_marginal_rates(self):
+        households = generate_households(50, seed=5)
+        inputs = ('w2', 'long_term_capital_gain', 'roth_conversion_gain', 'gifts', 'rental_income')
+        batch = batch_marginal_rates(columns_from_households(households), inputs=inputs)
+        for i, params in enumerate(households):
+            rates = marginal_rates(params)
+            self.assertEqual(rates['federal_income_tax_withheld'], -1)
+            for name in inputs:
+                self.assertAlmostEqual(rates[name], batch[name][i], places=9)
+
+    def test_every_input(self):
+        # Every input, where float noise used to pick the wrong branch of a
+        # max or min, e.g. of SS withholding against rate * min(cap, wages).
+        households = generate_households(200, seed=5)
+        batch = batch_marginal_rates(columns_from_households(households))
+        for i, params in enumerate(households):
+            for name, rate in marginal_rates(params).items():
+                self.assertAlmostEqual(rate, batch[name][i], places=9, msg=f"{i} {name}")
+
+    def test_batch_values(self):
+        columns = columns_from_households(generate_households(100, seed=5))
+        dual = {
+            name: DualArray.variable(columns[name], index)
+            for index, name in enumerate(INPUTS)}
+        results = compute_batch({**columns, **dual}, DUAL_COMPUTERS)
+        for name, values in compute_batch(columns).items():
+            np.testing.assert_array_equal(getattr(results[name], 'value', results[name]), values)
+
+
+class TestRothOptimizer(unittest.TestCase):
+
+    def test_brute_force(self):
+        households = generate_households(3, seed=1, profile='wages', years=[2018, 2019, 2020])
+        plan = optimize_conversions(households, 200000, step=20000)
+        self.assertEqual(sum(plan.amounts), 200000)
+
+        costs = conversion_costs(households, np.arange(11) * 20000)
+        expected = min(
+            sum(cost[count] for cost, count in zip(costs, counts))
+            for counts in itertools.product(range(11), repeat=3) if sum(counts) == 10)
+        self.assertAlmostEqual(plan.tax, expected, places=6)
+        self.assertAlmostEqual(plan.baseline_tax, sum(
+            compute_household(h).federal_tax_due + compute_household(h).state_tax_due
+            for h in households), places=6)
+
+    def test_invalid(self):
+        households = generate_households(2, seed=1, profile='wages', years=[2019, 2020])
+        with self.assertRaises(ValueError):
+            optimize_conversions(households, 150000, step=20000)
+        with self.assertRaises(ValueError):
+            optimize_conversions([], 200000, step=20000)
+        self.assertAlmostEqual(sum(optimize_conversions(households, 0.3, step=0.1).amounts), 0.3)
+
+
+class TestCarryoverPipeline(unittest.TestCase):
+
+    def households(self):
+        return [
+            generate_households(1, seed=year, profile='rental', years=[year])[0]
+            for year in range(2012, 2021)]
+
+    def test_carryovers(self):
+        households = self.households()
+        households[0]['form_1099s'] = [Form1099(id='Broker', long_term_capital_gain=-50000)]
+        years = CarryoverPipeline().run(households)
+        self.assertEqual(years[1].household['capital_loss_carryover'], 47000)
+        for previous, year in zip(years, years[1:]):
+            self.assertEqual(
+                year.household['state_tax_adjustments_for_previous_return'],
+                previous.result.state_tax_due)
+            self.assertEqual(year.result, compute_household(year.household))
+
+    def test_memoized(self):
+        households = self.households()
+        pipeline = CarryoverPipeline()
+        pipeline.run(households)
+        self.assertEqual(pipeline.misses, 9)
+
+        households[5] = {**households[5], 'gifts': households[5]['gifts'] + 1000}
+        pipeline.run(households)
+        self.assertGreaterEqual(pipeline.hits, 5)
+        self.assertGreater(pipeline.misses, 9)
+
+    def test_portfolio(self):
+        households = self.households()[:3]
+        rentals = households[0]['real_estates']
+        households = [
+            {**household, 'real_estates': RentalPortfolio(rentals), 'rental_loss_carryover': 0}
+            for household in households]
+        portfolio = households[0]['real_estates']
+        rental = next(iter(portfolio.incomes))
+        portfolio.set_carryover(rental, 1000000)
+        pipeline = CarryoverPipeline()
+        years = pipeline.run(households)
+        for previous, year in zip(years, years[1:]):
+            self.assertEqual(year.household['rental_loss_carryover'], 0)
+            self.assertAlmostEqual(
+                year.household['real_estates'].rental_loss_carryover,
+                previous.carryovers.rental_loss_carryover, places=6)
+        self.assertLess(years[1].household['real_estates'].rental_loss_carryover, 1000000)
+
+        real_estate = portfolio[rental]
+        portfolio.update(real_estate._replace(rents=real_estate.rents + 5000000))
+        updated = pipeline.run(households)
+        self.assertEqual(updated[0].result, compute_household(households[0]))
+        self.assertNotEqual(updated[0].result, years[0].result)
+
+
+class TestTaxServer(unittest.TestCase):
+
+    def serve(self, **kwargs):
+        server = make_server(port=0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def check(self, client):
+        households = generate_households(20)
+        expected = [compute_household(h)._asdict() for h in households]
+        self.assertEqual(client.compute(households[0]), expected[0])
+        self.assertEqual(client.compute_many(households), expected)
+        with self.assertRaises(ValueError):
+            client.compute({'year': 'unknown'})
+
+        with self.assertRaisesRegex(ValueError, 'ZeroDivisionError'):
+            client.compute({'year': 2020})
+
+        metrics = client.metrics()
+        self.assertEqual(metrics['households'], 21)
+        self.assertEqual(metrics['endpoints']['/compute']['requests'], 3)
+        self.assertEqual(metrics['endpoints']['/compute']['errors'], 2)
+
+    def test_http(self):
+        server = self.serve()
+        self.check(TaxClient(f"http://127.0.0.1:{server.server_address[1]}"))
+
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/tax.sock"
+            self.serve(unix_socket=path)
+            self.check(TaxClient(unix_socket=path))
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        modules = subprocess.run(
+            [sys.executable, '-c', "import sys, tax; print(' '.join(sys.modules))"],
+            check=True, capture_output=True, text=True).stdout.split()
+        for module in ('matplotlib', 'numpy', 'concurrent.futures'):
+            self.assertNotIn(module, modules)
+
+    def test_json(self):
+        output = subprocess.run(
+            [sys.executable, 'tax.py', 'demo_data', '--json'],
+            check=True, capture_output=True, text=True).stdout
+        numbers = importlib.import_module('demo_data')
+        params = {k: numbers.__dict__[k] for k in dir(numbers) if not k.startswith('__')}
+        self.assertEqual(json.loads(output), compute_household(params)._asdict())
+
+
+class TestMonteCarlo(unittest.TestCase):
+
+    def test_constant(self):
+        params = generate_households(1, seed=2, profile='amt', years=[2017])[0]
+        expected = compute_household(params)
+        summary = simulate(params, {'gifts': Empirical([params['gifts']])}, draws=1000)
+        for p, value in summary.percentiles['federal_tax_due'].items():
+            self.assertAlmostEqual(value, expected.federal_tax_due, places=6)
+        self.assertAlmostEqual(summary.mean['state_tax_due'], expected.state_tax_due, places=6)
+        self.assertEqual(summary.amt_probability, 1.0 if expected.amt > 0 else 0.0)
+
+    def test_reproducible(self):
+        params = generate_households(1, seed=2, profile='amt', years=[2017])[0]
+        distributions = {
+            ('w2', 'medicare_wages', 'state_wages'): Normal(400000, 80000),
+            'long_term_capital_gain': LogNormal(20000, 1),
+        }
+        summary = simulate(params, distributions, draws=20000, seed=7, batch=3000, workers=1)
+        self.assertEqual(summary, simulate(params, distributions, draws=20000, seed=7, batch=3000, workers=2))
+        self.assertNotEqual(summary, simulate(params, distributions, draws=20000, seed=8, batch=3000, workers=1))
+        self.assertLess(summary.percentiles['federal_tax_due'][10], summary.percentiles['federal_tax_due'][90])
+        self.assertTrue(0 < summary.amt_probability < 1)
+
+        with self.assertRaises(ValueError):
+            simulate(params, {'wages': Normal(0, 1)})
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_cache(self):
+        households = generate_households(30)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory, max_entries=20)
+            for household in households + households[-10:]:
+                self.assertEqual(cache.compute(household), compute_household(household))
+            stats = cache.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (10, 30, 20))
+            self.assertIn('lookup_us', stats)
+            cache.close()
+
+            cache = ResultCache(directory, max_entries=20)
+            cache.compute(households[0])
+            cache.compute(households[-1])
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            cache.close()
+
+            cache = ResultCache(directory, version='edited tables')
+            self.assertEqual(cache.entries, 0)
+            cache.close()
+
+    def test_sources(self):
+        # Every module a result is computed in, once the inputs are aggregated.
+        for source in ('defs.py', 'household.py', 'tax_computer.py', 'federal_tax_computer.py',
+                       'state_tax_computer.py', 'tax_tables.py', 'tax_brackets.py'):
+            self.assertIn(source, SOURCES)
+
+
 if __name__ == '__main__':
         unittest.main()
@@ -0,0 +1,88 @@
+from collections import deque, namedtuple
+
+import json
+import logging
+import numbers
+
+
+TraceRecord = namedtuple('TraceRecord', [
+    'source',
+    'step',
+    'inputs',
+    'result',
+])
+
+
+class Tracer:
+    """Collects (step, inputs, result) records of a computation.
+
+    Call sites check `tracer.enabled` before calling record(), so while
+    tracing is off nothing is built, formatted or logged. Records are kept
+    as plain values and rendered on demand. Only the last `max_records`
+    are kept; a long-running process that traces should clear() them
+    after rendering.
+    """
+
+    def __init__(self, max_records=100000):
+        self.enabled = False
+        self.echo = None
+        self.records = deque(maxlen=max_records)
+
+
+    def enable(self, echo=None):
+        """Start recording; echo, if given, is called with each record."""
+        self.enabled = True
+        self.echo = echo
+
+
+    def disable(self):
+        self.enabled = False
+        self.echo = None
+
+
+    def clear(self):
+        self.records.clear()
+
+
+    def record(self, source, step, result, **inputs):
+        record = TraceRecord(
+            type(source).__name__ if source is not None else '',
+            step,
+            inputs,
+            result)
+        self.records.append(record)
+        if self.echo is not None:
+            self.echo(record)
+
+
+    def render_text(self):
+        return '\n'.join(format_record(record) for record in self.records)
+
+
+    def render_json(self):
+        return json.dumps([record._asdict() for record in self.records], default=float)
+
+
+def format_record(record):
+    """One record in the human-readable form of the debug log."""
+    step = f"{record.source}.{record.step}" if record.source else record.step
+    line = f"{step} = {_format(record.result)}"
+    if record.inputs:
+        line += " (" + ", ".join(
+            f"{name}={_format(value)}" for name, value in record.inputs.items()) + ")"
+    return line
+
+
+def log_record(record):
+    """Echo for Tracer.enable() that sends records to the debug log, as
+    logged by the method that called Tracer.record()."""
+    logging.debug(format_record(record), stacklevel=3)
+
+
+def _format(value):
+    if isinstance(value, numbers.Real) and not isinstance(value, (bool, numbers.Integral)):
+        return f"{value:.0f}" if abs(value) >= 1 else f"{value:g}"
+    return str(value)
+
+
+tracer = Tracer()